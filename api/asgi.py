@@ -0,0 +1,302 @@
+import asyncio
+import io
+import json
+import logging
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import session
+
+
+def build_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    """Minimal WSGI environ for an ASGI HTTP scope, enough to open the Flask session"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin1').upper().replace('-', '_')
+        value = raw_value.decode('latin1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsgiApp:
+    """ASGI entry point for the web app.
+
+    The RPC-bound routes run as coroutines, so one process can serve hundreds of
+    concurrent balance and send requests without a thread per request. Auth,
+    sessions, templates and all other routes are the Flask app's own, served
+    through a WSGI adapter. `web` is the module defining the Flask app (app.py or
+    api/index.py).
+    """
+
+    def __init__(self, web):
+        self.web = web
+        self.flask_app = web.app
+        self.wsgi = WsgiToAsgi(web.app)
+        # POST routes served natively on the event loop, everything else goes to Flask
+        self.routes: Dict[str, Callable[..., Awaitable[bool]]] = {
+            '/get_balances': self._get_balances,
+            '/send_transactions': self._send_transactions,
+            '/get_balances/stream': self._stream_balances,
+            '/send_transactions/stream': self._stream_send_transactions
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        handler = self.routes.get(scope.get('path')) if scope['type'] == 'http' else None
+        if handler is None or scope['method'] != 'POST':
+            return await self.wsgi(scope, receive, send)
+
+        body = await self._read_body(receive)
+        if await handler(scope, body, send):
+            return
+
+        # Not handled natively (e.g. not logged in): let Flask answer with the body replayed
+        await self.wsgi(scope, self._replay(body), send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.to_thread(self.web.async_runtime.stop)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    @staticmethod
+    def _replay(body: bytes):
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return {'type': 'http.disconnect'}
+        return receive
+
+    def _load_wallets(self, environ: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Authenticate and load the session's wallets, None when Flask should handle the request"""
+        with self.flask_app.request_context(environ):
+            if not self.web.is_authenticated():
+                return None
+            key = session.get('session_id') or session.get('wallet_key')
+            if not key or session.modified:
+                return None
+            return self.web.wallet_store.get(key)
+
+    async def _prepare(self, scope, body: bytes):
+        """Parse the JSON body and load wallets, or (None, None) to fall back to Flask"""
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            return None, None
+        if not isinstance(data, dict):
+            return None, None
+
+        wallets = await asyncio.to_thread(self._load_wallets, build_environ(scope, body))
+        if wallets is None:
+            return None, None
+        return data, wallets
+
+    async def _run(self, coro):
+        # Pooled connections and caches live on the shared runtime loop
+        return await asyncio.wrap_future(self.web.async_runtime.submit(coro))
+
+    async def _iterate(self, agen):
+        try:
+            while True:
+                try:
+                    yield await self._run(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            await self._run(agen.aclose())
+
+    @staticmethod
+    async def _json(send, status: int, data: Dict[str, Any]):
+        body = json.dumps(data).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _sse(self, send, events):
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ]
+        })
+        try:
+            async for event in events:
+                await send({'type': 'http.response.body', 'body': event.encode(), 'more_body': True})
+        finally:
+            # Also stops the underlying work when the client disconnects
+            await events.aclose()
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _get_balances(self, scope, body: bytes, send) -> bool:
+        data, wallets = await self._prepare(scope, body)
+        if data is None:
+            return False
+
+        network_config = data.get('network')
+        if not network_config:
+            await self._json(send, 400, {'error': 'Konfigurasi jaringan diperlukan'})
+        elif not wallets:
+            await self._json(send, 400, {'error': 'Tidak ada wallet yang diimpor'})
+        else:
+            try:
+                balances = await self._run(self.web.blockchain_service.get_balances_async(
+                    [w['address'] for w in wallets],
+                    network_config,
+                    use_cache=not data.get('refresh')
+                ))
+                await self._json(send, 200, {'success': True, 'balances': balances})
+            except Exception as e:
+                logging.error(f"Error getting balances: {e}")
+                await self._json(send, 500, {'error': str(e)})
+        return True
+
+    async def _send_transactions(self, scope, body: bytes, send) -> bool:
+        data, wallets = await self._prepare(scope, body)
+        if data is None:
+            return False
+
+        network_config = data.get('network')
+        percentage = data.get('percentage')
+        recipient_address = data.get('recipient_address')
+        if not all([network_config, percentage, recipient_address]):
+            await self._json(send, 400, {'error': 'Parameter yang diperlukan tidak lengkap'})
+        elif not wallets:
+            await self._json(send, 400, {'error': 'Tidak ada wallet yang diimpor'})
+        else:
+            try:
+                results = await self._run(self.web.blockchain_service.send_transactions_async(
+                    wallets, network_config, percentage, recipient_address, speed=data.get('speed')
+                ))
+                await self._json(send, 200, {'success': True, 'results': results})
+            except Exception as e:
+                logging.error(f"Error sending transactions: {e}")
+                await self._json(send, 500, {'error': str(e)})
+        return True
+
+    async def _stream_balances(self, scope, body: bytes, send) -> bool:
+        data, wallets = await self._prepare(scope, body)
+        if data is None:
+            return False
+
+        network_config = data.get('network')
+        if not network_config:
+            await self._json(send, 400, {'error': 'Konfigurasi jaringan diperlukan'})
+            return True
+        if not wallets:
+            await self._json(send, 400, {'error': 'Tidak ada wallet yang diimpor'})
+            return True
+
+        addresses = [w['address'] for w in wallets]
+        sse_event = self.web.sse_event
+
+        async def events():
+            yield sse_event({'total': len(addresses)}, event='start')
+            try:
+                agen = self.web.blockchain_service.iter_balances_async(
+                    addresses, network_config, use_cache=not data.get('refresh')
+                )
+                async for balance in self._iterate(agen):
+                    yield sse_event(balance, event='balance')
+                yield sse_event({'success': True}, event='done')
+            except Exception as e:
+                logging.error(f"Error streaming balances: {e}")
+                yield sse_event({'error': str(e)}, event='error')
+
+        await self._sse(send, events())
+        return True
+
+    async def _stream_send_transactions(self, scope, body: bytes, send) -> bool:
+        data, wallets = await self._prepare(scope, body)
+        if data is None:
+            return False
+
+        network_config = data.get('network')
+        percentage = data.get('percentage')
+        recipient_address = data.get('recipient_address')
+        if not all([network_config, percentage, recipient_address]):
+            await self._json(send, 400, {'error': 'Parameter yang diperlukan tidak lengkap'})
+            return True
+        if not wallets:
+            await self._json(send, 400, {'error': 'Tidak ada wallet yang diimpor'})
+            return True
+
+        sse_event = self.web.sse_event
+
+        async def events():
+            started = time.monotonic()
+            yield sse_event({'total': len(wallets)}, event='start')
+            try:
+                agen = self.web.blockchain_service.iter_send_transactions_async(
+                    wallets, network_config, percentage, recipient_address, speed=data.get('speed')
+                )
+                tx_hashes = []
+                async for result in self._iterate(agen):
+                    if result['tx_hash']:
+                        tx_hashes.append(result['tx_hash'])
+                    yield sse_event(result, event='result')
+                agen = self.web.blockchain_service.iter_receipts_async(
+                    network_config, tx_hashes, timeout=self.web.stream_receipt_timeout(started)
+                )
+                async for update in self._iterate(agen):
+                    yield sse_event(update, event='receipt')
+                yield sse_event({'success': True}, event='done')
+            except Exception as e:
+                logging.error(f"Error streaming transactions: {e}")
+                yield sse_event({'error': str(e)}, event='error')
+
+        await self._sse(send, events())
+        return True
+
+
+def create_asgi_app(web) -> AsgiApp:
+    """Wrap the Flask app defined in module `web` (app.py or api/index.py) for ASGI servers"""
+    return AsgiApp(web)
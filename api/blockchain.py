@@ -1,19 +1,67 @@
 import asyncio
 import logging
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Callable, AsyncIterator, Optional
+from eth_abi import encode as abi_encode, decode as abi_decode
+from eth_account import Account
 from web3 import Web3
 from web3.exceptions import TransactionNotFound
-import aiohttp
 import json
+from rpc_client import RpcClient
+from endpoint_pool import PooledRpcClient
+from provider_registry import ProviderRegistry
+from network_context import NetworkContext
+from nonce_manager import NonceManager, is_nonce_error
+from fee_engine import FeeEngine
+from receipt_tracker import ReceiptTracker, PENDING
+from balance_cache import BalanceCache
+from crypto_pool import sign_transactions_async
+from retry_policy import RetryPolicy, RetryBudget, is_already_known, is_retryable
+
+# Multicall3 is deployed at the same address on most EVM chains
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+AGGREGATE_SELECTOR = Web3.keccak(text='aggregate((address,bytes)[])')[:4]
+GET_ETH_BALANCE_SELECTOR = Web3.keccak(text='getEthBalance(address)')[:4]
 
 class BlockchainService:
     """Service for blockchain interactions using Web3.py"""
     
-    def __init__(self):
+    def __init__(self, rpc_client: RpcClient = None, provider_registry: ProviderRegistry = None):
+        # Long-lived pooled client shared by balance checks, gas queries and broadcasts,
+        # routing each network's calls across its RPC URLs with failover
+        self.rpc = PooledRpcClient(rpc_client or RpcClient())
+        # Providers and their health state, reused across wallets and requests
+        self.providers = provider_registry or ProviderRegistry()
+        # Locally tracked nonces, so repeated sends from one wallet don't collide
+        self.nonces = NonceManager()
+        # EIP-1559 fees from a per-chain fee history window, refreshed once per block
+        self.fees = FeeEngine(self.rpc)
+        # Batched receipt polling for broadcast transactions
+        self.receipts = ReceiptTracker(self.rpc)
+        # Jittered retries for transient RPC failures, bounded per batch by a RetryBudget
+        self.retry = RetryPolicy()
+        # Recently read balances per (RPC endpoints, chain_id, address), dropped when we send from or to them
+        self.balance_cache = BalanceCache()
+        self.multicall_chunk_size = int(os.environ.get("MULTICALL_CHUNK_SIZE", 500))
+        # Maximum number of wallets a batch send works on at the same time
+        self.send_concurrency = int(os.environ.get("SEND_CONCURRENCY", 50))
+        # Wallets signed before each batched broadcast of their raw transactions
+        self.broadcast_batch_size = int(os.environ.get("BROADCAST_BATCH_SIZE", 100))
+        # Addresses per chunk when streaming balances, smaller chunks give a faster first result
+        self.balance_stream_chunk_size = int(os.environ.get("BALANCE_STREAM_CHUNK_SIZE", 100))
+        # Seconds between gas data refreshes during one batch, 0 resolves it once per batch
+        self.context_refresh_interval = float(os.environ.get("NETWORK_CONTEXT_REFRESH", 0))
+        # (rpc_url, chain_id) -> whether Multicall3 is deployed there
+        self._multicall_support: Dict[tuple, bool] = {}
         self.predefined_networks = {
             'ethereum': {
                 'name': 'Ethereum Mainnet',
                 'rpc_url': 'https://eth.llamarpc.com',
+                'rpc_urls': [
+                    'https://eth.llamarpc.com',
+                    'https://ethereum-rpc.publicnode.com',
+                    'https://rpc.ankr.com/eth'
+                ],
                 'chain_id': 1,
                 'symbol': 'ETH',
                 'explorer': 'https://etherscan.io'
@@ -21,6 +69,11 @@ class BlockchainService:
             'sepolia': {
                 'name': 'Sepolia Testnet',
                 'rpc_url': 'https://ethereum-sepolia-rpc.publicnode.com',
+                'rpc_urls': [
+                    'https://ethereum-sepolia-rpc.publicnode.com',
+                    'https://rpc.sepolia.org',
+                    'https://sepolia.drpc.org'
+                ],
                 'chain_id': 11155111,
                 'symbol': 'ETH',
                 'explorer': 'https://sepolia.etherscan.io'
@@ -28,6 +81,10 @@ class BlockchainService:
             'holesky': {
                 'name': 'Holesky Testnet',
                 'rpc_url': 'https://ethereum-holesky.publicnode.com',
+                'rpc_urls': [
+                    'https://ethereum-holesky.publicnode.com',
+                    'https://holesky.drpc.org'
+                ],
                 'chain_id': 17000,
                 'symbol': 'ETH',
                 'explorer': 'https://holesky.etherscan.io'
@@ -35,186 +92,704 @@ class BlockchainService:
             'monad': {
                 'name': 'Monad Testnet',
                 'rpc_url': 'https://testnet-rpc.monad.xyz',
+                'rpc_urls': [
+                    'https://testnet-rpc.monad.xyz'
+                ],
                 'chain_id': 41454,
                 'symbol': 'MON',
                 'explorer': 'https://testnet-explorer.monad.xyz'
             }
         }
+        # Fallback URLs for requests that only name a predefined network's primary URL
+        self._known_rpc_urls = {network['rpc_url']: network['rpc_urls']
+                                for network in self.predefined_networks.values()}
+    
+    def _rpc_url(self, network_config: Dict[str, Any]) -> str:
+        """Primary RPC URL of a network, with its other URLs registered for failover"""
+        rpc_url = str(network_config.get('rpc_url'))
+        urls = network_config.get('rpc_urls') or self._known_rpc_urls.get(rpc_url, [])
+        chain_id = network_config.get('chain_id')
+        return self.rpc.register(rpc_url, urls, int(chain_id) if chain_id is not None else None)
+    
+    def _balance_source(self, network_config: Dict[str, Any]) -> tuple:
+        """The endpoints a network's balances are read from, so cached balances stay with them"""
+        rpc_url = str(network_config.get('rpc_url'))
+        urls = network_config.get('rpc_urls') or self._known_rpc_urls.get(rpc_url, [])
+        return tuple(dict.fromkeys([rpc_url] + [str(url) for url in urls if url]))
     
     def get_address_from_private_key(self, private_key: str) -> str:
         """Generate wallet address from private key"""
         try:
-            w3 = Web3()
-            account = w3.eth.account.from_key(private_key)
+            account = Account.from_key(private_key)
             return account.address
         except Exception as e:
             logging.error(f"Error generating address: {e}")
             raise
     
-    def get_web3_instance(self, network_config: Dict[str, Any]) -> Web3:
-        """Create Web3 instance for given network"""
-        rpc_url = network_config.get('rpc_url')
-        if not rpc_url:
-            raise ValueError("RPC URL is required")
-        
-        w3 = Web3(Web3.HTTPProvider(rpc_url))
-        
-        # Verify connection
-        if not w3.is_connected():
-            raise ConnectionError(f"Failed to connect to {rpc_url}")
-        
-        return w3
+    def _balance_result(self, address: str, balance_wei: int) -> Dict[str, Any]:
+        balance_eth = balance_wei / 10**18
+        return {
+            'address': address,
+            'balance_wei': balance_wei,
+            'balance_eth': balance_eth,
+            'balance_formatted': f"{balance_eth:.6f}"
+        }
     
-    async def get_balance_async(self, address: str, network_config: Dict[str, Any]) -> Dict[str, Any]:
+    def _balance_error(self, address: str, error: Exception) -> Dict[str, Any]:
+        logging.error(f"Error getting balance for {address}: {error}")
+        return {
+            'address': address,
+            'balance_wei': 0,
+            'balance_eth': 0,
+            'balance_formatted': "0.000000",
+            'error': str(error)
+        }
+    
+    async def get_balance_async(self, address: str, network_config: Dict[str, Any],
+                                budget: RetryBudget = None) -> Dict[str, Any]:
         """Get balance for a single address asynchronously"""
         try:
-            rpc_url = network_config.get('rpc_url')
+            rpc_url = self._rpc_url(network_config)
             
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "jsonrpc": "2.0",
-                    "method": "eth_getBalance",
-                    "params": [address, "latest"],
-                    "id": 1
-                }
-                
-                async with session.post(str(rpc_url), json=payload) as response:
-                    data = await response.json()
-                    
-                    if 'error' in data:
-                        raise Exception(f"RPC Error: {data['error']}")
-                    
-                    balance_wei = int(data['result'], 16)
-                    balance_eth = balance_wei / 10**18
-                    
-                    return {
-                        'address': address,
-                        'balance_wei': balance_wei,
-                        'balance_eth': balance_eth,
-                        'balance_formatted': f"{balance_eth:.6f}"
-                    }
+            result = await self.retry.run(
+                lambda: self.rpc.call(rpc_url, "eth_getBalance", [address, "latest"]),
+                budget, f"Balance read for {address}"
+            )
+            
+            return self._balance_result(address, int(result, 16))
         except Exception as e:
-            logging.error(f"Error getting balance for {address}: {e}")
-            return {
-                'address': address,
-                'balance_wei': 0,
-                'balance_eth': 0,
-                'balance_formatted': "0.000000",
-                'error': str(e)
-            }
+            return self._balance_error(address, e)
     
-    async def get_balances_async(self, addresses: List[str], network_config: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Get balances for multiple addresses concurrently"""
-        tasks = [self.get_balance_async(addr, network_config) for addr in addresses]
-        return await asyncio.gather(*tasks)
+    async def get_balances_async(self, addresses: List[str], network_config: Dict[str, Any],
+                                 batch_size: int = None, budget: RetryBudget = None,
+                                 use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Get balances for multiple addresses, serving recently read ones from the balance cache"""
+        chain_id = network_config.get('chain_id')
+        if not use_cache or chain_id is None:
+            return await self._read_balances_async(addresses, network_config, batch_size, budget)
+        
+        source = self._balance_source(network_config)
+        hits = self.balance_cache.get_many(source, chain_id, addresses)
+        missing = [addr for addr in dict.fromkeys(addresses) if addr not in hits]
+        if missing and self.balance_cache.has_block_pinned(source, chain_id, missing):
+            # Entries past their TTL are still good if the chain has barely moved since
+            try:
+                block_number = int(await self.rpc.call(self._rpc_url(network_config), "eth_blockNumber"), 16)
+                hits.update(self.balance_cache.get_many(source, chain_id, missing, current_block=block_number))
+                missing = [addr for addr in missing if addr not in hits]
+            except Exception as e:
+                logging.debug(f"Block number unavailable for balance cache: {e}")
+        
+        fetched = {}
+        if missing:
+            for balance in await self._read_balances_async(missing, network_config, batch_size, budget):
+                if 'error' not in balance:
+                    self.balance_cache.put(source, chain_id, balance['address'], balance['balance_wei'],
+                                           balance.get('block_number'))
+                fetched[balance['address']] = balance
+        
+        balances = []
+        for address in addresses:
+            if address in fetched:
+                balances.append(fetched[address])
+                continue
+            entry = hits[address]
+            balance = self._balance_result(address, entry.balance_wei)
+            if entry.block_number is not None:
+                balance['block_number'] = entry.block_number
+            balance['cached'] = True
+            balances.append(balance)
+        return balances
+    
+    async def _read_balances_async(self, addresses: List[str], network_config: Dict[str, Any],
+                                   batch_size: int = None, budget: RetryBudget = None) -> List[Dict[str, Any]]:
+        """Read balances from the node, via Multicall3 where the chain has it"""
+        budget = budget or RetryBudget.for_batch(len(addresses))
+        if await self.supports_multicall_async(network_config):
+            try:
+                return await self.retry.run(
+                    lambda: self.get_balances_multicall_async(addresses, network_config),
+                    budget, "Multicall balance read"
+                )
+            except Exception as e:
+                logging.warning(f"Multicall balance read failed: {e}, falling back to eth_getBalance")
+        
+        return await self.get_balances_batch_async(addresses, network_config, batch_size=batch_size, budget=budget)
+    
+    async def iter_balances_async(self, addresses: List[str], network_config: Dict[str, Any],
+                                  chunk_size: int = None, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """Yield each balance, tagged with its index, as soon as its chunk has been read"""
+        size = chunk_size or self.balance_stream_chunk_size
+        budget = RetryBudget.for_batch(len(addresses))
+        
+        async def read_chunk(start):
+            return start, await self.get_balances_async(addresses[start:start + size], network_config,
+                                                        budget=budget, use_cache=use_cache)
+        
+        tasks = [asyncio.ensure_future(read_chunk(start)) for start in range(0, len(addresses), size)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                start, balances = await next_done
+                for offset, balance in enumerate(balances):
+                    yield {'index': start + offset, **balance}
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def get_balances_batch_async(self, addresses: List[str], network_config: Dict[str, Any],
+                                       batch_size: int = None, budget: RetryBudget = None) -> List[Dict[str, Any]]:
+        """Get balances for multiple addresses using JSON-RPC batch requests"""
+        rpc_url = self._rpc_url(network_config)
+        calls = [("eth_getBalance", [addr, "latest"]) for addr in addresses]
+        budget = budget or RetryBudget.for_batch(len(addresses))
+        
+        results = await self.rpc.batch(rpc_url, calls, batch_size=batch_size)
+        
+        # Read the transiently failed entries again, in one batch per attempt
+        attempt = 0
+        while True:
+            retry = [i for i, result in enumerate(results)
+                     if isinstance(result, Exception) and self.retry.should_retry(result, attempt, budget)]
+            if not retry:
+                break
+            await asyncio.sleep(self.retry.backoff(attempt))
+            retried = await self.rpc.batch(rpc_url, [calls[i] for i in retry], batch_size=batch_size)
+            for i, result in zip(retry, retried):
+                results[i] = result
+            attempt += 1
+        
+        balances = []
+        for address, result in zip(addresses, results):
+            if isinstance(result, Exception):
+                balances.append(self._balance_error(address, result))
+                continue
+            try:
+                balances.append(self._balance_result(address, int(result, 16)))
+            except Exception as e:
+                balances.append(self._balance_error(address, e))
+        return balances
+    
+    async def supports_multicall_async(self, network_config: Dict[str, Any]) -> bool:
+        """Check (once per network) whether Multicall3 is deployed"""
+        multicall_address = network_config.get('multicall3', MULTICALL3_ADDRESS)
+        if not multicall_address:
+            return False
+        
+        key = (network_config.get('rpc_url'), network_config.get('chain_id'))
+        if key not in self._multicall_support:
+            try:
+                code = await self.rpc.call(self._rpc_url(network_config), "eth_getCode",
+                                           [multicall_address, "latest"])
+                self._multicall_support[key] = bool(code) and code not in ('0x', '0x0')
+            except Exception as e:
+                # Don't cache transient failures, try again on the next request
+                logging.warning(f"Multicall3 detection failed: {e}")
+                return False
+        return self._multicall_support[key]
     
-    async def estimate_gas_async(self, w3: Web3, transaction: Dict[str, Any]) -> int:
+    async def get_balances_multicall_async(self, addresses: List[str],
+                                           network_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get balances with Multicall3 getEthBalance aggregation, all read at the same block"""
+        rpc_url = self._rpc_url(network_config)
+        multicall_address = network_config.get('multicall3', MULTICALL3_ADDRESS)
+        
+        valid = [addr for addr in addresses if Web3.is_address(addr)]
+        
+        # Pin every chunk to one block so the balances form a consistent snapshot
+        block_number = int(await self.rpc.call(rpc_url, "eth_blockNumber"), 16)
+        block_tag = hex(block_number)
+        
+        size = self.multicall_chunk_size
+        chunks = [valid[i:i + size] for i in range(0, len(valid), size)]
+        calls = []
+        for chunk in chunks:
+            aggregate_calls = [
+                (multicall_address, GET_ETH_BALANCE_SELECTOR + abi_encode(['address'], [Web3.to_checksum_address(addr)]))
+                for addr in chunk
+            ]
+            data = AGGREGATE_SELECTOR + abi_encode(['(address,bytes)[]'], [aggregate_calls])
+            calls.append(("eth_call", [{'to': multicall_address, 'data': Web3.to_hex(data)}, block_tag]))
+        
+        results = await self.rpc.batch(rpc_url, calls)
+        
+        balances_by_address = {}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                raise result
+            _, return_data = abi_decode(['uint256', 'bytes[]'], Web3.to_bytes(hexstr=result))
+            for addr, raw in zip(chunk, return_data):
+                balances_by_address[addr] = abi_decode(['uint256'], raw)[0]
+        
+        balances = []
+        for address in addresses:
+            if address in balances_by_address:
+                balance = self._balance_result(address, balances_by_address[address])
+                balance['block_number'] = block_number
+                balances.append(balance)
+            else:
+                balances.append(self._balance_error(address, ValueError("Invalid address")))
+        return balances
+    
+    async def send_raw_transaction_async(self, raw_transaction: bytes, network_config: Dict[str, Any]) -> str:
+        """Broadcast a signed transaction, to several of the network's endpoints when it has them"""
+        return await self.rpc.broadcast(
+            self._rpc_url(network_config),
+            "eth_sendRawTransaction",
+            [Web3.to_hex(raw_transaction)]
+        )
+    
+    async def broadcast_transaction_async(self, signed_transaction, network_config: Dict[str, Any],
+                                          budget: RetryBudget = None) -> str:
+        """Broadcast a signed transaction, re-sending the same raw bytes after transient failures.
+        
+        Re-sending is idempotent: the hash can't change, and a node that already
+        got an earlier attempt answers "already known", which counts as success.
+        """
+        tx_hash = Web3.to_hex(signed_transaction.hash)
+        attempt = 0
+        while True:
+            try:
+                return await self.send_raw_transaction_async(signed_transaction.raw_transaction, network_config)
+            except Exception as e:
+                if is_already_known(e):
+                    return tx_hash
+                # An earlier attempt that timed out may have landed and used the nonce
+                if attempt and is_nonce_error(e) and await self._transaction_known_async(tx_hash, network_config):
+                    return tx_hash
+                if not self.retry.should_retry(e, attempt, budget):
+                    raise
+                delay = self.retry.backoff(attempt)
+                logging.info(f"Broadcast of {tx_hash} failed ({e}), re-sending in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+    
+    async def _transaction_known_async(self, tx_hash: str, network_config: Dict[str, Any]) -> bool:
+        try:
+            return await self.rpc.call(self._rpc_url(network_config), "eth_getTransactionByHash", [tx_hash]) is not None
+        except Exception:
+            return False
+    
+    async def close(self):
+        """Release pooled RPC connections"""
+        await self.rpc.close()
+    
+    async def get_transaction_count_async(self, address: str, network_config: Dict[str, Any],
+                                          block: str = "latest") -> int:
+        """Get the nonce for an address through the pooled RPC client"""
+        result = await self.rpc.call(self._rpc_url(network_config), "eth_getTransactionCount",
+                                     [address, block])
+        return int(result, 16)
+    
+    async def estimate_gas_async(self, network_config: Dict[str, Any], transaction: Dict[str, Any]) -> int:
         """Estimate gas for transaction"""
         try:
-            return w3.eth.estimate_gas(transaction)  # type: ignore
+            params = {key: Web3.to_hex(value) if isinstance(value, int) else value
+                      for key, value in transaction.items()}
+            result = await self.rpc.call(self._rpc_url(network_config), "eth_estimateGas", [params])
+            return int(result, 16)
         except Exception as e:
             logging.warning(f"Gas estimation failed: {e}, using default")
             return 21000  # Standard ETH transfer gas limit
     
+    async def get_network_context_async(self, network_config: Dict[str, Any], recipient_address: str,
+                                        sample_address: str = None,
+                                        refresh_interval: float = None,
+                                        speed: str = None) -> NetworkContext:
+        """Resolve the fees, chain id check and gas limit shared by a batch"""
+        # Register the network's fallback URLs before the context's concurrent calls
+        self._rpc_url(network_config)
+        if refresh_interval is None:
+            refresh_interval = self.context_refresh_interval
+        context = NetworkContext(network_config, recipient_address, sample_address, refresh_interval, speed)
+        return await context.resolve(self)
+    
+    def _failed_result(self, address: str, error: str, status: str = 'failed') -> Dict[str, Any]:
+        return {
+            'wallet': address,
+            'status': status,
+            'error': error,
+            'amount': '0',
+            'tx_hash': None
+        }
+    
+    def _sign_transaction(self, transaction: Dict[str, Any], private_key: str):
+        """Sign a transaction locally"""
+        return Account.sign_transaction(transaction, private_key)
+    
+    async def _prepare_transaction_async(self, wallet: Dict[str, Any], network_config: Dict[str, Any],
+                                         percentage: int, recipient_address: str, context: NetworkContext,
+                                         balance_wei: int, budget: RetryBudget = None,
+                                         pending_count: int = None, sign: bool = True):
+        """Work out the amount, reserve a nonce and sign. Returns (prepared, None) or (None, failed result).
+        
+        With sign=False the unsigned 'transaction' is returned for the caller to sign in bulk.
+        """
+        from_address = wallet['address']
+        
+        if balance_wei == 0:
+            return None, self._failed_result(from_address, 'Insufficient balance')
+        
+        if percentage == 100:
+            # Legacy pricing is charged exactly, so nothing is refunded back into the emptied wallet
+            gas_price = context.fees.sweep_gas_price()
+            fee_fields = {'gasPrice': gas_price}
+        else:
+            # maxFeePerGas on EIP-1559 chains, so the balance always covers the worst case
+            gas_price = context.gas_price
+            fee_fields = context.fees.transaction_fields()
+        estimated_gas = context.gas_limit
+        
+        # Calculate total gas cost
+        gas_cost = estimated_gas * gas_price
+        
+        # Calculate amount to send based on percentage
+        if percentage == 100:  # MAX
+            amount_to_send = balance_wei - gas_cost
+        else:
+            amount_to_send = (balance_wei * percentage) // 100
+        
+        # Ensure we have enough for gas
+        if amount_to_send <= 0 or (amount_to_send + gas_cost) > balance_wei:
+            return None, self._failed_result(from_address, 'Insufficient balance for transaction + gas')
+        
+        chain_id = network_config['chain_id']
+        
+        async def fetch_pending():
+            if pending_count is not None:
+                # Already read for the whole chunk in one batch
+                return pending_count
+            return await self.retry.run(
+                lambda: self.get_transaction_count_async(from_address, network_config, "pending"),
+                budget, f"Nonce read for {from_address}"
+            )
+        
+        nonce = await self.nonces.reserve(chain_id, from_address, fetch_pending)
+        
+        # Build transaction
+        transaction = {
+            'nonce': nonce,
+            'to': recipient_address,
+            'value': amount_to_send,
+            'gas': estimated_gas,
+            'chainId': chain_id,
+            **fee_fields
+        }
+        
+        prepared = {'wallet': wallet, 'nonce': nonce, 'amount': amount_to_send, 'transaction': transaction}
+        if sign:
+            try:
+                prepared['signed'] = self._sign_transaction(transaction, wallet['private_key'])
+            except Exception:
+                self.nonces.release(chain_id, from_address, nonce)
+                raise
+        return prepared, None
+    
+    def _broadcast_succeeded(self, prepared: Dict[str, Any], tx_hash_hex: str, network_config: Dict[str, Any],
+                             recipient_address: str) -> Dict[str, Any]:
+        from_address = prepared['wallet']['address']
+        chain_id = network_config['chain_id']
+        self.nonces.confirm(chain_id, from_address, prepared['nonce'])
+        # Both balances are about to change, and change again once the transaction is mined
+        self.balance_cache.invalidate(chain_id, [from_address, recipient_address])
+        self.balance_cache.watch_transaction(tx_hash_hex, chain_id, [from_address, recipient_address])
+        
+        # Convert amount to ETH for display
+        amount_eth = prepared['amount'] / 10**18
+        
+        return {
+            'wallet': from_address,
+            'status': 'success',
+            'error': None,
+            'amount': f"{amount_eth:.6f}",
+            'tx_hash': tx_hash_hex,
+            'confirmation': PENDING,
+            'explorer_url': f"{network_config.get('explorer', '')}/tx/{tx_hash_hex}"
+        }
+    
+    def _broadcast_failed(self, prepared: Dict[str, Any], error: Exception, network_config: Dict[str, Any],
+                          recipient_address: str):
+        from_address = prepared['wallet']['address']
+        chain_id = network_config['chain_id']
+        # After a transient failure the node may still have the transaction, so resync too
+        self.nonces.release(chain_id, from_address, prepared['nonce'],
+                            resync=is_nonce_error(error) or is_retryable(error))
+        if is_retryable(error):
+            self.balance_cache.invalidate(chain_id, [from_address, recipient_address])
+    
     async def send_transaction_async(self, wallet: Dict[str, Any], network_config: Dict[str, Any], 
-                                   percentage: int, recipient_address: str) -> Dict[str, Any]:
+                                   percentage: int, recipient_address: str,
+                                   context: NetworkContext = None,
+                                   budget: RetryBudget = None) -> Dict[str, Any]:
         """Send transaction from a single wallet"""
+        prepared = None
         try:
-            w3 = self.get_web3_instance(network_config)
-            private_key = wallet['private_key']
+            rpc_url = self._rpc_url(network_config)
             from_address = wallet['address']
             
-            # Get current balance
-            balance_wei = w3.eth.get_balance(from_address)
-            
-            if balance_wei == 0:
-                return {
-                    'wallet': from_address,
-                    'status': 'failed',
-                    'error': 'Insufficient balance',
-                    'amount': '0',
-                    'tx_hash': None
-                }
-            
-            # Get current nonce
-            nonce = w3.eth.get_transaction_count(from_address)
-            
-            # Get gas price
-            gas_price = w3.eth.gas_price
-            
-            # Estimate gas for the transaction
-            estimated_gas = await self.estimate_gas_async(w3, {
-                'from': from_address,
-                'to': recipient_address,
-                'value': 1  # Small value for estimation
-            })
-            
-            # Calculate total gas cost
-            gas_cost = estimated_gas * gas_price
-            
-            # Calculate amount to send based on percentage
-            if percentage == 100:  # MAX
-                amount_to_send = balance_wei - gas_cost
+            if context is None:
+                context = await self.get_network_context_async(network_config, recipient_address, from_address)
             else:
-                amount_to_send = (balance_wei * percentage) // 100
+                context = await context.get(self)
             
-            # Ensure we have enough for gas
-            if amount_to_send <= 0 or (amount_to_send + gas_cost) > balance_wei:
-                return {
-                    'wallet': from_address,
-                    'status': 'failed',
-                    'error': 'Insufficient balance for transaction + gas',
-                    'amount': '0',
-                    'tx_hash': None
-                }
+            # Only the balance is specific to this wallet, its nonce is tracked locally
+            balance_wei = int(await self.retry.run(
+                lambda: self.rpc.call(rpc_url, "eth_getBalance", [from_address, "latest"]),
+                budget, f"Balance read for {from_address}"
+            ), 16)
             
-            # Build transaction
-            transaction = {
-                'nonce': nonce,
-                'to': recipient_address,
-                'value': amount_to_send,
-                'gas': estimated_gas,
-                'gasPrice': gas_price,
-                'chainId': network_config['chain_id']
-            }
+            # A stale local nonce is resynced from the node and the send retried once
+            for attempt in range(2):
+                prepared, failed = await self._prepare_transaction_async(
+                    wallet, network_config, percentage, recipient_address, context, balance_wei, budget
+                )
+                if failed:
+                    return failed
+                
+                # Send transaction
+                try:
+                    tx_hash_hex = await self.broadcast_transaction_async(prepared['signed'], network_config, budget)
+                except Exception as e:
+                    self._broadcast_failed(prepared, e, network_config, recipient_address)
+                    if is_nonce_error(e) and attempt == 0:
+                        logging.warning(f"Nonce {prepared['nonce']} rejected for {from_address}, resyncing: {e}")
+                        continue
+                    raise
+                
+                return self._broadcast_succeeded(prepared, tx_hash_hex, network_config, recipient_address)
+            
+        except Exception as e:
+            logging.error(f"Error sending transaction from {wallet['address']}: {e}")
+            return self._failed_result(wallet['address'], str(e))
+        finally:
+            # Cancelled between reserving the nonce and settling it, don't leave it reserved
+            if prepared:
+                self.nonces.abandon(network_config['chain_id'], wallet['address'], prepared['nonce'])
+    
+    async def send_transactions_async(self, wallets: List[Dict[str, Any]], network_config: Dict[str, Any],
+                                    percentage: int, recipient_address: str,
+                                    concurrency: int = None,
+                                    context_refresh: float = None,
+                                    speed: str = None,
+                                    on_result: Callable[[Dict[str, Any]], None] = None,
+                                    should_cancel: Callable[[], bool] = None) -> List[Dict[str, Any]]:
+        """Send transactions from multiple wallets, in chunks of `broadcast_batch_size`.
+        
+        Each chunk is signed in full first (balances read in one go, at most
+        `concurrency` wallets preparing at a time), then broadcast with batched
+        eth_sendRawTransaction calls. speed picks the fee tier (slow, standard,
+        fast). on_result is called with each wallet's result as soon as it is
+        ready. Once should_cancel returns True, wallets not yet broadcast are skipped.
+        """
+        if not wallets:
+            return []
+        
+        budget = RetryBudget.for_batch(len(wallets))
+        results: List[Dict[str, Any]] = [None] * len(wallets)
+        
+        def emit(index, result):
+            results[index] = result
+            if on_result:
+                on_result(result)
+        
+        # Resolve chain data once for the whole batch instead of once per wallet
+        try:
+            context = await self.retry.run(
+                lambda: self.get_network_context_async(
+                    network_config, recipient_address, wallets[0]['address'],
+                    refresh_interval=context_refresh, speed=speed
+                ),
+                budget, "Network context"
+            )
+        except Exception as e:
+            logging.error(f"Network not ready for batch send: {e}")
+            for index, wallet in enumerate(wallets):
+                emit(index, self._failed_result(wallet['address'], str(e)))
+            return results
+        
+        semaphore = asyncio.Semaphore(concurrency or self.send_concurrency)
+        size = self.broadcast_batch_size
+        for start in range(0, len(wallets), size):
+            chunk = list(enumerate(wallets[start:start + size], start))
+            if should_cancel and should_cancel():
+                for index, wallet in chunk:
+                    emit(index, self._failed_result(wallet['address'], 'Cancelled', status='cancelled'))
+                continue
+            # Sweeps are priced just above the base fee, so every later chunk needs current fees
+            refresh = percentage == 100 and start > 0
+            await self._send_chunk_async(chunk, network_config, percentage, recipient_address, context,
+                                         budget, semaphore, emit, should_cancel, refresh)
+        return results
+    
+    async def _send_chunk_async(self, chunk: List[tuple], network_config: Dict[str, Any], percentage: int,
+                                recipient_address: str, context: NetworkContext, budget: RetryBudget,
+                                semaphore: asyncio.Semaphore, emit: Callable, should_cancel: Callable[[], bool],
+                                refresh: bool = False):
+        """Sign every wallet in the chunk, then broadcast the signed transactions in batches"""
+        rpc_url = self._rpc_url(network_config)
+        chain_id = network_config['chain_id']
+        try:
+            context = await context.get(self, refresh=refresh)
+            balances = await self._read_balances_async([wallet['address'] for _, wallet in chunk],
+                                                       network_config, budget=budget)
             
-            # Sign transaction
-            signed_txn = w3.eth.account.sign_transaction(transaction, private_key)
+            # Pending counts for wallets without a locally tracked nonce, in one batch
+            unsynced = [address for address in dict.fromkeys(wallet['address'] for _, wallet in chunk)
+                        if self.nonces.needs_sync(chain_id, address)]
+            pending_counts = {}
+            if unsynced:
+                counts = await self.rpc.batch(rpc_url, [("eth_getTransactionCount", [address, "pending"])
+                                                        for address in unsynced])
+                pending_counts = {address: int(count, 16) for address, count in zip(unsynced, counts)
+                                  if isinstance(count, str)}
+        except Exception as e:
+            logging.error(f"Error preparing batch send: {e}")
+            for index, wallet in chunk:
+                emit(index, self._failed_result(wallet['address'], str(e)))
+            return
+        
+        # Every nonce reserved for this chunk, so a cancelled chunk can hand back the unsettled ones
+        reserved = []
+        
+        async def prepare(index, wallet, balance):
+            async with semaphore:
+                if should_cancel and should_cancel():
+                    emit(index, self._failed_result(wallet['address'], 'Cancelled', status='cancelled'))
+                    return None
+                if 'error' in balance:
+                    emit(index, self._failed_result(wallet['address'], balance['error']))
+                    return None
+                try:
+                    prepared, failed = await self._prepare_transaction_async(
+                        wallet, network_config, percentage, recipient_address, context,
+                        balance['balance_wei'], budget, pending_counts.get(wallet['address']), sign=False
+                    )
+                except Exception as e:
+                    logging.error(f"Error preparing transaction from {wallet['address']}: {e}")
+                    failed = self._failed_result(wallet['address'], str(e))
+                if failed:
+                    emit(index, failed)
+                    return None
+                reserved.append(prepared)
+                return index, prepared
+        
+        try:
+            # Phase 1: build everything, then sign it in bulk off the event loop
+            built = [item for item in await asyncio.gather(*[
+                prepare(index, wallet, balance) for (index, wallet), balance in zip(chunk, balances)
+            ]) if item]
+            signatures = await sign_transactions_async([(prepared['transaction'], prepared['wallet']['private_key'])
+                                                        for _, prepared in built])
+            signed = []
+            for (index, prepared), (signed_txn, error) in zip(built, signatures):
+                if error:
+                    self.nonces.release(chain_id, prepared['wallet']['address'], prepared['nonce'])
+                    emit(index, self._failed_result(prepared['wallet']['address'], error))
+                    continue
+                prepared['signed'] = signed_txn
+                signed.append((index, prepared))
+            if not signed:
+                return
             
-            # Send transaction
-            tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-            tx_hash_hex = tx_hash.hex()
+            if should_cancel and should_cancel():
+                for index, prepared in signed:
+                    self.nonces.release(chain_id, prepared['wallet']['address'], prepared['nonce'])
+                    emit(index, self._failed_result(prepared['wallet']['address'], 'Cancelled', status='cancelled'))
+                return
             
-            # Convert amount to ETH for display
-            amount_eth = amount_to_send / 10**18
+            # Phase 2: broadcast the raw transactions in JSON-RPC batches
+            calls = [("eth_sendRawTransaction", [Web3.to_hex(prepared['signed'].raw_transaction)])
+                     for _, prepared in signed]
+            responses = await self.rpc.batch(rpc_url, calls)
             
-            return {
-                'wallet': from_address,
-                'status': 'success',
-                'error': None,
-                'amount': f"{amount_eth:.6f}",
-                'tx_hash': tx_hash_hex,
-                'explorer_url': f"{network_config.get('explorer', '')}/tx/{tx_hash_hex}"
-            }
+            async def settle(index, prepared, response):
+                if not isinstance(response, Exception):
+                    emit(index, self._broadcast_succeeded(prepared, response, network_config, recipient_address))
+                    return
+                
+                wallet = prepared['wallet']
+                try:
+                    if is_already_known(response):
+                        tx_hash_hex = Web3.to_hex(prepared['signed'].hash)
+                    elif is_retryable(response):
+                        # Re-send the same signed bytes on their own, which is safe to repeat
+                        tx_hash_hex = await self.broadcast_transaction_async(prepared['signed'], network_config, budget)
+                    else:
+                        raise response
+                except Exception as e:
+                    self._broadcast_failed(prepared, e, network_config, recipient_address)
+                    if is_nonce_error(e):
+                        # Stale nonce: redo this wallet on the single-send path, which resyncs and retries
+                        logging.warning(f"Nonce {prepared['nonce']} rejected for {wallet['address']}, resyncing: {e}")
+                        emit(index, await self.send_transaction_async(wallet, network_config, percentage,
+                                                                      recipient_address, context, budget))
+                    else:
+                        logging.error(f"Error sending transaction from {wallet['address']}: {e}")
+                        emit(index, self._failed_result(wallet['address'], str(e)))
+                    return
+                emit(index, self._broadcast_succeeded(prepared, tx_hash_hex, network_config, recipient_address))
             
-        except Exception as e:
-            logging.error(f"Error sending transaction from {wallet['address']}: {e}")
-            return {
-                'wallet': wallet['address'],
-                'status': 'failed',
-                'error': str(e),
-                'amount': '0',
-                'tx_hash': None
-            }
+            await asyncio.gather(*[settle(index, prepared, response)
+                                   for (index, prepared), response in zip(signed, responses)])
+        finally:
+            for prepared in reserved:
+                self.nonces.abandon(chain_id, prepared['wallet']['address'], prepared['nonce'])
     
-    async def send_transactions_async(self, wallets: List[Dict[str, Any]], network_config: Dict[str, Any],
-                                    percentage: int, recipient_address: str) -> List[Dict[str, Any]]:
-        """Send transactions from multiple wallets concurrently"""
-        tasks = [
-            self.send_transaction_async(wallet, network_config, percentage, recipient_address)
-            for wallet in wallets
-        ]
-        return await asyncio.gather(*tasks)
+    async def iter_send_transactions_async(self, wallets: List[Dict[str, Any]], network_config: Dict[str, Any],
+                                           percentage: int, recipient_address: str,
+                                           **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """Yield each wallet's send result as soon as it is ready"""
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.send_transactions_async(
+            wallets, network_config, percentage, recipient_address, on_result=queue.put_nowait, **kwargs
+        ))
+        try:
+            remaining = len(wallets)
+            while remaining:
+                if not queue.empty():
+                    remaining -= 1
+                    yield queue.get_nowait()
+                    continue
+                if task.done():
+                    # Finished (or failed) without producing more results
+                    task.result()
+                    break
+                
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait([getter, task], return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    remaining -= 1
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            task.cancel()
+    
+    async def iter_receipts_async(self, network_config: Dict[str, Any], tx_hashes: List[str],
+                                  should_cancel: Callable[[], bool] = None,
+                                  timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield confirmed/failed/dropped (or, at the timeout, pending) for each broadcast hash"""
+        self._rpc_url(network_config)  # registers fallback URLs for the tracker's calls
+        async for update in self.receipts.iter_receipts(network_config, tx_hashes, should_cancel, timeout):
+            self._receipt_resolved(update)
+            yield update
+    
+    async def track_receipts_async(self, network_config: Dict[str, Any], tx_hashes: List[str],
+                                   on_update: Callable[[Dict[str, Any]], None] = None,
+                                   should_cancel: Callable[[], bool] = None) -> Dict[str, Dict[str, Any]]:
+        """Wait for the receipts of broadcast hashes and return tx_hash -> confirmation update"""
+        self._rpc_url(network_config)  # registers fallback URLs for the tracker's calls
+        
+        def resolved(update):
+            self._receipt_resolved(update)
+            if on_update:
+                on_update(update)
+        
+        return await self.receipts.track(network_config, tx_hashes, resolved, should_cancel)
+    
+    def _receipt_resolved(self, update: Dict[str, Any]):
+        # A balance read while the transaction was pending may have been cached
+        if update['confirmation'] != PENDING:
+            self.balance_cache.invalidate_transaction(update['tx_hash'])
     
     def get_predefined_networks(self) -> Dict[str, Dict[str, Any]]:
         """Get list of predefined networks"""
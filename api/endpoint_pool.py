@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from retry_policy import is_retryable
+from rpc_client import RpcClient, RpcError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class Endpoint:
+    """Latency and circuit breaker state for one RPC URL"""
+
+    def __init__(self, url: str):
+        self.url = url
+        # Exponentially weighted moving average of response time, None until first measured
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # None until eth_chainId was checked, False when the endpoint serves another chain
+        self.verified: Optional[bool] = None
+        self.last_error: Optional[str] = None
+
+    def state(self, cooldown: float) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= cooldown:
+            return HALF_OPEN
+        return OPEN
+
+    def record_success(self, latency: float, alpha: float):
+        self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+
+    def record_failure(self, error: Any, threshold: int):
+        self.failures += 1
+        self.last_error = str(error)
+        # A failed half-open probe re-opens the circuit straight away
+        if self.failures >= threshold or self.opened_at is not None:
+            if self.opened_at is None:
+                logging.warning(f"Circuit opened for {self.url}: {error}")
+            self.opened_at = time.monotonic()
+
+
+class EndpointPool:
+    """The RPC URLs of one network, ranked fastest healthy first"""
+
+    def __init__(self, urls: List[str], chain_id: Optional[int]):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.chain_id = chain_id
+
+    def ranked(self, cooldown: float) -> List[Endpoint]:
+        usable = [endpoint for endpoint in self.endpoints if endpoint.verified is not False]
+        closed = [endpoint for endpoint in usable if endpoint.state(cooldown) == CLOSED]
+        # Unmeasured endpoints sort first so each gets its latency measured once
+        closed.sort(key=lambda endpoint: endpoint.latency or 0.0)
+        probing = [endpoint for endpoint in usable if endpoint.state(cooldown) == HALF_OPEN]
+        if closed or probing:
+            return closed + probing
+        # Every circuit is open: try the one that has been resting longest rather than nothing
+        return sorted(usable, key=lambda endpoint: endpoint.opened_at)
+
+
+class PooledRpcClient:
+    """Routes JSON-RPC calls for a network across its RPC URLs with failover.
+
+    Callers keep addressing a network by its primary `rpc_url`. Once a network
+    with several URLs is registered, reads go to the fastest healthy endpoint
+    (EWMA latency), transport failures fail over to the next one, and repeated
+    failures open an endpoint's circuit for ENDPOINT_COOLDOWN seconds.
+    Broadcasts go to several endpoints at once. Deterministic JSON-RPC errors
+    (reverts, nonce errors) are answers, not outages, and are raised as-is;
+    rate limit and transient node errors count as endpoint failures.
+    """
+
+    def __init__(self, client: Optional[RpcClient] = None, ewma_alpha: Optional[float] = None,
+                 failure_threshold: Optional[int] = None, cooldown: Optional[float] = None,
+                 broadcast_fanout: Optional[int] = None):
+        self.client = client or RpcClient()
+        self.ewma_alpha = ewma_alpha or float(os.environ.get("ENDPOINT_EWMA_ALPHA", 0.3))
+        self.failure_threshold = failure_threshold or int(os.environ.get("ENDPOINT_FAILURE_THRESHOLD", 3))
+        self.cooldown = cooldown or float(os.environ.get("ENDPOINT_COOLDOWN", 30))
+        self.broadcast_fanout = broadcast_fanout or int(os.environ.get("BROADCAST_FANOUT", 2))
+        # primary rpc_url -> pool of that network's endpoints
+        self._pools: Dict[str, EndpointPool] = {}
+        # Fan-out broadcasts still running after the first endpoint answered
+        self._background = set()
+
+    def register(self, rpc_url: str, urls: List[str], chain_id: Optional[int] = None) -> str:
+        """Route calls addressed to rpc_url across urls; returns rpc_url"""
+        urls = list(dict.fromkeys([rpc_url] + [str(url) for url in urls if url]))
+        pool = self._pools.get(rpc_url)
+        if len(urls) > 1 and (pool is None or [e.url for e in pool.endpoints] != urls or pool.chain_id != chain_id):
+            self._pools[rpc_url] = EndpointPool(urls, chain_id)
+        return rpc_url
+
+    def endpoints(self, rpc_url: str) -> List[Endpoint]:
+        """Endpoints for rpc_url in the order they would be tried"""
+        pool = self._pools.get(rpc_url)
+        return pool.ranked(self.cooldown) if pool else [Endpoint(rpc_url)]
+
+    async def _verify(self, pool: EndpointPool, endpoint: Endpoint) -> bool:
+        """Check once that an endpoint serves the pool's chain"""
+        if endpoint.verified is not None or pool.chain_id is None:
+            return endpoint.verified is not False
+        remote_chain_id = int(await self.client.call(endpoint.url, "eth_chainId"), 16)
+        endpoint.verified = remote_chain_id == pool.chain_id
+        if not endpoint.verified:
+            endpoint.last_error = f"Chain ID mismatch: RPC reports {remote_chain_id}, expected {pool.chain_id}"
+            logging.warning(f"Ignoring endpoint {endpoint.url}: {endpoint.last_error}")
+        return endpoint.verified
+
+    async def _timed(self, endpoint: Endpoint, request):
+        start = time.monotonic()
+        result = await request
+        endpoint.record_success(time.monotonic() - start, self.ewma_alpha)
+        return result
+
+    @staticmethod
+    def _is_endpoint_failure(error: Exception) -> bool:
+        """Whether another endpoint might answer differently"""
+        return not isinstance(error, RpcError) or is_retryable(error)
+
+    async def call(self, rpc_url: str, method: str, params: Optional[List[Any]] = None) -> Any:
+        pool = self._pools.get(rpc_url)
+        if pool is None:
+            return await self.client.call(rpc_url, method, params)
+
+        last_error: Optional[Exception] = None
+        for endpoint in pool.ranked(self.cooldown):
+            try:
+                if not await self._verify(pool, endpoint):
+                    continue
+                return await self._timed(endpoint, self.client.call(endpoint.url, method, params))
+            except Exception as e:
+                if not self._is_endpoint_failure(e):
+                    raise
+                endpoint.record_failure(e, self.failure_threshold)
+                last_error = e
+        raise last_error or ConnectionError(f"No usable RPC endpoint for {rpc_url}")
+
+    async def batch(self, rpc_url: str, calls: List[Tuple[str, List[Any]]],
+                    batch_size: Optional[int] = None) -> List[Any]:
+        pool = self._pools.get(rpc_url)
+        if pool is None:
+            return await self.client.batch(rpc_url, calls, batch_size=batch_size)
+        if not calls:
+            return []
+
+        results: List[Any] = [ConnectionError(f"No usable RPC endpoint for {rpc_url}")] * len(calls)
+        todo = list(range(len(calls)))
+        for endpoint in pool.ranked(self.cooldown):
+            try:
+                if not await self._verify(pool, endpoint):
+                    continue
+            except Exception as e:
+                endpoint.record_failure(e, self.failure_threshold)
+                continue
+
+            start = time.monotonic()
+            chunk = await self.client.batch(endpoint.url, [calls[i] for i in todo], batch_size=batch_size)
+            failed = []
+            for i, result in zip(todo, chunk):
+                results[i] = result
+                # Transport, rate limit and transient node failures are retried elsewhere
+                if isinstance(result, Exception) and self._is_endpoint_failure(result):
+                    failed.append(i)
+
+            if len(failed) < len(todo):
+                endpoint.record_success(time.monotonic() - start, self.ewma_alpha)
+            else:
+                endpoint.record_failure(results[failed[0]], self.failure_threshold)
+            todo = failed
+            if not todo:
+                break
+        return results
+
+    async def broadcast(self, rpc_url: str, method: str, params: Optional[List[Any]] = None) -> Any:
+        """Send a write to the best few endpoints at once and return the first success"""
+        pool = self._pools.get(rpc_url)
+        if pool is None:
+            return await self.client.call(rpc_url, method, params)
+
+        candidates = pool.ranked(self.cooldown)[:self.broadcast_fanout]
+        checks = await asyncio.gather(*[self._verify(pool, endpoint) for endpoint in candidates],
+                                      return_exceptions=True)
+        targets = [endpoint for endpoint, ok in zip(candidates, checks) if ok is True]
+        if not targets:
+            # None of the best endpoints answered, use the regular failover path
+            return await self.call(rpc_url, method, params)
+
+        async def send(endpoint: Endpoint):
+            try:
+                return await self._timed(endpoint, self.client.call(endpoint.url, method, params))
+            except Exception as e:
+                if self._is_endpoint_failure(e):
+                    endpoint.record_failure(e, self.failure_threshold)
+                raise
+
+        tasks = [asyncio.ensure_future(send(endpoint)) for endpoint in targets]
+        errors = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            # Let the other endpoints finish propagating the transaction
+            for task in tasks:
+                if not task.done():
+                    self._background.add(task)
+                    task.add_done_callback(self._finish_background)
+
+        # Prefer the node's own rejection (e.g. a nonce error) over a transport or throttling failure
+        rpc_errors = [e for e in errors if not self._is_endpoint_failure(e)]
+        raise (rpc_errors or errors)[0]
+
+    def _finish_background(self, task: asyncio.Future):
+        self._background.discard(task)
+        if not task.cancelled():
+            task.exception()
+
+    async def close(self):
+        await self.client.close()
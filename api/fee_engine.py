@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# tier -> (priority fee percentile over the window, base fee multiplier for maxFeePerGas)
+DEFAULT_TIERS = {
+    'slow': (10, 1.25),
+    'standard': (50, 2.0),
+    'fast': (90, 2.5)
+}
+# Headroom over the current base fee for sweep transactions, one block's worth of base fee growth
+SWEEP_BASE_FEE_MULTIPLIER = float(os.environ.get("SWEEP_BASE_FEE_MULTIPLIER", 1.125))
+
+
+class FeeQuote:
+    """Fee fields for one transaction type, plus the worst-case cost per gas unit"""
+
+    def __init__(self, max_fee_per_gas: int, max_priority_fee_per_gas: Optional[int] = None,
+                 base_fee: Optional[int] = None, block_number: Optional[int] = None):
+        self.max_fee_per_gas = max_fee_per_gas
+        self.max_priority_fee_per_gas = max_priority_fee_per_gas
+        self.base_fee = base_fee
+        self.block_number = block_number
+
+    @property
+    def is_eip1559(self) -> bool:
+        return self.max_priority_fee_per_gas is not None
+
+    @property
+    def cost_per_gas(self) -> int:
+        """Most the sender can pay per gas unit, used to reserve gas from the balance"""
+        return self.max_fee_per_gas
+
+    def transaction_fields(self) -> Dict[str, int]:
+        if self.is_eip1559:
+            return {
+                'maxFeePerGas': self.max_fee_per_gas,
+                'maxPriorityFeePerGas': self.max_priority_fee_per_gas
+            }
+        return {'gasPrice': self.max_fee_per_gas}
+
+    def sweep_gas_price(self) -> int:
+        """Exact gasPrice for a legacy (type 0) transaction that empties the sender.
+
+        A type 2 transaction reserves maxFeePerGas and refunds what the block
+        didn't charge, leaving that dust in a swept wallet. A legacy gasPrice is
+        charged in full, so the balance can be sent down to zero; it is priced
+        just above the current base fee to keep that overpayment small.
+        """
+        if not self.is_eip1559 or self.base_fee is None:
+            return self.max_fee_per_gas
+        return min(self.max_fee_per_gas,
+                   int(self.base_fee * SWEEP_BASE_FEE_MULTIPLIER) + self.max_priority_fee_per_gas)
+
+
+class FeeHistoryEntry:
+    def __init__(self, block_number: int, base_fee: int, rewards: Dict[int, int]):
+        self.block_number = block_number
+        self.base_fee = base_fee
+        # percentile -> median priority fee over the window
+        self.rewards = rewards
+        self.checked_at = time.monotonic()
+
+
+class FeeEngine:
+    """EIP-1559 fee estimation from a cached eth_feeHistory window per chain.
+
+    The window is fetched again only when the chain has moved to a new block
+    (checked at most every FEE_REFRESH_INTERVAL seconds), so a whole batch, and
+    concurrent batches on the same chain, share one fee history read per block.
+    Chains without EIP-1559 fall back to legacy eth_gasPrice.
+    """
+
+    def __init__(self, rpc_client, tiers: Optional[Dict[str, Tuple[int, float]]] = None,
+                 history_blocks: Optional[int] = None, refresh_interval: Optional[float] = None):
+        self.rpc = rpc_client
+        self.tiers = tiers or self._tiers_from_env()
+        self.history_blocks = history_blocks or int(os.environ.get("FEE_HISTORY_BLOCKS", 20))
+        self.refresh_interval = refresh_interval or float(os.environ.get("FEE_REFRESH_INTERVAL", 2))
+        self.default_speed = os.environ.get("FEE_SPEED", "standard")
+        self._history: Dict[tuple, FeeHistoryEntry] = {}
+        # Chains known to lack EIP-1559
+        self._legacy_chains = set()
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+        self._loop = None
+
+    @staticmethod
+    def _tiers_from_env() -> Dict[str, Tuple[int, float]]:
+        # e.g. FEE_TIERS='{"fast": [95, 3]}' overrides or adds tiers
+        tiers = dict(DEFAULT_TIERS)
+        raw = os.environ.get("FEE_TIERS")
+        if raw:
+            try:
+                for name, (percentile, multiplier) in json.loads(raw).items():
+                    tiers[name] = (int(percentile), float(multiplier))
+            except Exception as e:
+                logging.warning(f"Ignoring invalid FEE_TIERS: {e}")
+        return tiers
+
+    def _lock(self, key: tuple) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._locks = {}
+            self._loop = loop
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    async def get_fees_async(self, network_config: Dict[str, Any], speed: Optional[str] = None) -> FeeQuote:
+        """Fee quote for the given speed tier (slow, standard, fast)"""
+        rpc_url = str(network_config.get('rpc_url'))
+        key = (rpc_url, network_config.get('chain_id'))
+        percentile, multiplier = self.tiers.get(speed or self.default_speed, self.tiers['standard'])
+
+        if network_config.get('eip1559') is False or key in self._legacy_chains:
+            return await self._legacy_quote(rpc_url)
+
+        try:
+            history = await self._get_history(key, rpc_url)
+        except Exception as e:
+            logging.info(f"Fee history unavailable for {rpc_url}, using legacy gas price: {e}")
+            return await self._legacy_quote(rpc_url)
+        if history is None:
+            self._legacy_chains.add(key)
+            return await self._legacy_quote(rpc_url)
+
+        priority_fee = history.rewards.get(percentile)
+        if priority_fee is None:
+            priority_fee = history.rewards[min(history.rewards, key=lambda p: abs(p - percentile))]
+        max_fee = int(history.base_fee * multiplier) + priority_fee
+        return FeeQuote(max_fee, priority_fee, history.base_fee, history.block_number)
+
+    async def _legacy_quote(self, rpc_url: str) -> FeeQuote:
+        return FeeQuote(int(await self.rpc.call(rpc_url, "eth_gasPrice"), 16))
+
+    async def _get_history(self, key: tuple, rpc_url: str) -> Optional[FeeHistoryEntry]:
+        entry = self._history.get(key)
+        if entry and time.monotonic() - entry.checked_at < self.refresh_interval:
+            return entry
+
+        async with self._lock(key):
+            entry = self._history.get(key)
+            if entry and time.monotonic() - entry.checked_at < self.refresh_interval:
+                return entry
+
+            block_number = int(await self.rpc.call(rpc_url, "eth_blockNumber"), 16)
+            if entry and entry.block_number == block_number:
+                entry.checked_at = time.monotonic()
+                return entry
+
+            percentiles = sorted({percentile for percentile, _ in self.tiers.values()})
+            result = await self.rpc.call(rpc_url, "eth_feeHistory",
+                                         [hex(self.history_blocks), hex(block_number), percentiles])
+            base_fees = [int(fee, 16) for fee in result.get('baseFeePerGas') or []]
+            if not base_fees or not base_fees[-1]:
+                return None
+
+            rewards = {}
+            blocks = result.get('reward') or []
+            for column, percentile in enumerate(percentiles):
+                values = sorted(int(block[column], 16) for block in blocks if len(block) > column)
+                rewards[percentile] = values[len(values) // 2] if values else 0
+
+            # The last base fee is the one for the next block
+            entry = FeeHistoryEntry(block_number, base_fees[-1], rewards)
+            self._history[key] = entry
+            return entry
@@ -0,0 +1,167 @@
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class Job:
+    """A background batch operation whose results are collected as they arrive"""
+
+    def __init__(self, kind: str, owner: str, total: int):
+        self.id = secrets.token_urlsafe(12)
+        self.kind = kind
+        self.owner = owner
+        self.total = total
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.results: List[Dict[str, Any]] = []
+        # tx_hash -> latest receipt status, updated after the result itself was reported
+        self.confirmations: Dict[str, Dict[str, Any]] = {}
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.finished_monotonic: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Ask the job to stop; work already in flight is allowed to finish"""
+        self._cancel_event.set()
+        with self._lock:
+            if self.status == QUEUED:
+                self._finish(CANCELLED)
+
+    def add_result(self, result: Dict[str, Any]):
+        with self._lock:
+            self.results.append(result)
+
+    def set_confirmation(self, update: Dict[str, Any]):
+        with self._lock:
+            self.confirmations[update['tx_hash']] = update
+
+    def _finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.utcnow()
+        self.finished_monotonic = time.monotonic()
+
+    def to_dict(self, offset: int = 0) -> Dict[str, Any]:
+        """Job status with the results from `offset` on, for incremental polling"""
+        with self._lock:
+            results = self.results[offset:]
+            completed = len(self.results)
+            confirmations = dict(self.confirmations)
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'total': self.total,
+            'completed': completed,
+            'offset': offset,
+            'results': results,
+            'confirmations': confirmations,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobManager:
+    """Runs jobs on background worker threads so they outlive the submitting request.
+
+    A job's main work holds one of `max_workers` threads. Its optional
+    follow-up (e.g. waiting for receipts) is handed to `submitter` and runs
+    without a thread, so long waits don't queue other users' jobs.
+    """
+
+    def __init__(self, runner: Callable[[Any], Any], max_workers: Optional[int] = None,
+                 retention: Optional[float] = None, submitter: Optional[Callable[[Any], Future]] = None):
+        # runner(coroutine) runs a coroutine to completion and returns its result
+        self.runner = runner
+        # submitter(coroutine) schedules a coroutine and returns a concurrent Future right away
+        self.submitter = submitter
+        self.max_workers = max_workers or int(os.environ.get("JOB_WORKERS", 4))
+        self.retention = retention or float(os.environ.get("JOB_RETENTION", 3600))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, owner: str, total: int, work: Callable[[Job], Any],
+               follow_up: Optional[Callable[[Job, Any], Any]] = None) -> Job:
+        """Queue `work(job)`, a coroutine factory, and return the job right away.
+
+        follow_up(job, result), also a coroutine factory, runs once the work is
+        done; the job stays running until it finishes too.
+        """
+        job = Job(kind, owner, total)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, work, follow_up)
+        return job
+
+    def get(self, job_id: str, owner: str) -> Optional[Job]:
+        """Get a job, only for the owner that submitted it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def _run(self, job: Job, work: Callable[[Job], Any], follow_up: Optional[Callable[[Job, Any], Any]]):
+        with job._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started_at = datetime.utcnow()
+
+        try:
+            result = self.runner(work(job))
+            if follow_up is not None:
+                if self.submitter is not None:
+                    # Frees this worker thread, the job finishes when the follow-up does
+                    future = self.submitter(follow_up(job, result))
+                    future.add_done_callback(lambda done: self._follow_up_done(job, done))
+                    return
+                self.runner(follow_up(job, result))
+        except Exception as e:
+            self._complete(job, e)
+            return
+        self._complete(job)
+
+    def _follow_up_done(self, job: Job, future: Future):
+        if future.cancelled():
+            with job._lock:
+                job._finish(CANCELLED)
+            return
+        self._complete(job, future.exception())
+
+    def _complete(self, job: Job, error: Optional[BaseException] = None):
+        with job._lock:
+            if error is not None:
+                logging.error(f"Job {job.id} failed: {error}")
+                job._finish(FAILED, str(error))
+            else:
+                job._finish(CANCELLED if job.cancel_requested else COMPLETED)
+
+    def _prune(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_monotonic and now - job.finished_monotonic > self.retention:
+                del self._jobs[job_id]
@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 32-byte hex private key, with or without 0x prefix
+PRIVATE_KEY_RE = re.compile(r'^(?:0x)?([0-9a-fA-F]{64})$')
+KEY_FIELDS = ('private_key', 'privatekey', 'private key', 'key', 'pk', 'secret')
+READ_SIZE = 64 * 1024
+
+
+class KeyFileParser:
+    """Streaming parser for uploaded private key files (.txt, .csv, .json or JSON lines).
+
+    Keys are yielded one at a time as (line, key) pairs, so memory use does not
+    depend on the file size. Invalid and duplicate entries are counted, and
+    the first `max_diagnostics` of them are kept with their position: a
+    'line' number, or for JSON files an 'entry' number.
+    """
+
+    def __init__(self, max_diagnostics: int = 100):
+        self.max_diagnostics = max_diagnostics
+        self.diagnostics: List[Dict[str, Any]] = []
+        self.valid_count = 0
+        self.invalid_count = 0
+        self.duplicate_count = 0
+        self._seen = set()
+        # What diagnostic positions count: 'line', or 'entry' for JSON values
+        self._unit = 'line'
+
+    def reject(self, line_no: int, error: str, value: str = ''):
+        """Count an invalid entry and keep its diagnostic"""
+        self.invalid_count += 1
+        self._report(line_no, error, value)
+
+    def _report(self, line_no: int, error: str, value: str = ''):
+        if len(self.diagnostics) < self.max_diagnostics:
+            preview = f"{value[:10]}..." if value else ''
+            self.diagnostics.append({self._unit: line_no, 'error': error, 'value': preview})
+
+    def _check(self, line_no: int, value: Any) -> Optional[str]:
+        """Validate and normalise one candidate, returning the 0x-prefixed key or None"""
+        value = str(value).strip() if value is not None else ''
+        if not value:
+            return None
+
+        match = PRIVATE_KEY_RE.match(value)
+        if not match:
+            self.reject(line_no, 'Format private key tidak valid', value)
+            return None
+
+        key = '0x' + match.group(1).lower()
+        if key in self._seen:
+            self.duplicate_count += 1
+            self._report(line_no, 'Private key duplikat', value)
+            return None
+
+        self._seen.add(key)
+        self.valid_count += 1
+        return key
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'valid_count': self.valid_count,
+            'invalid_count': self.invalid_count,
+            'duplicate_count': self.duplicate_count,
+            'diagnostics': self.diagnostics
+        }
+
+    def iter_keys(self, stream, filename: str = '') -> Iterator[Tuple[int, str]]:
+        """Yield (line, key) for every valid, first-seen key in a binary upload stream"""
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+        try:
+            name = (filename or '').lower()
+            if name.endswith('.csv'):
+                yield from self._iter_csv(text)
+            elif name.endswith('.json') or name.endswith('.jsonl'):
+                yield from self._iter_json(text)
+            else:
+                yield from self._iter_lines(text)
+        finally:
+            # Leave the underlying upload stream to its owner
+            text.detach()
+
+    def _iter_lines(self, text) -> Iterator[Tuple[int, str]]:
+        for line_no, line in enumerate(text, start=1):
+            key = self._check(line_no, line)
+            if key:
+                yield line_no, key
+
+    def _iter_csv(self, text) -> Iterator[Tuple[int, str]]:
+        reader = csv.reader(text)
+        key_column = None
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if key_column is None:
+                header = [cell.strip().lower() for cell in row]
+                matches = [i for i, cell in enumerate(header) if cell in KEY_FIELDS]
+                if matches:
+                    key_column = matches[0]
+                    continue
+                # No header: use the first column that holds a key
+                key_column = next((i for i, cell in enumerate(row) if PRIVATE_KEY_RE.match(cell.strip())), 0)
+
+            value = row[key_column] if key_column < len(row) else ''
+            key = self._check(reader.line_num, value)
+            if key:
+                yield reader.line_num, key
+
+    def _iter_json(self, text) -> Iterator[Tuple[int, str]]:
+        self._unit = 'entry'
+        for index, item in enumerate(self._iter_json_values(text), start=1):
+            if isinstance(item, dict):
+                fields = [field for field in item if str(field).lower() in KEY_FIELDS]
+                if not fields:
+                    self.reject(index, f"Objek JSON tanpa field private key ({', '.join(KEY_FIELDS)})",
+                                ', '.join(map(str, item)))
+                    continue
+                item = item[fields[0]]
+            if not isinstance(item, str):
+                self.reject(index, 'Entri JSON tidak berisi private key')
+                continue
+            key = self._check(index, item)
+            if key:
+                yield index, key
+
+    def _iter_json_values(self, text) -> Iterator[Any]:
+        """Incrementally decode a top-level JSON array or a sequence of JSON values (JSON lines).
+
+        Invalid or truncated JSON ends the file with a diagnostic at the entry
+        where decoding stopped; the entries before it are still yielded.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ''
+        eof = False
+        started = False
+        in_array = False
+        count = 0
+
+        while True:
+            # Skip separators between values
+            buffer = buffer.lstrip(' \t\r\n,')
+            if not started and buffer.startswith('['):
+                buffer = buffer[1:]
+                started = in_array = True
+                continue
+            if in_array and buffer.startswith(']'):
+                buffer = buffer[1:]
+                in_array = False
+                continue
+
+            if buffer:
+                try:
+                    value, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError as e:
+                    if eof:
+                        self.reject(count + 1, f'File JSON tidak valid: {e.msg}', buffer)
+                        return
+                else:
+                    # A number or literal cut at the read boundary may still continue
+                    if end < len(buffer) or eof or isinstance(value, (dict, list, str)):
+                        started = True
+                        buffer = buffer[end:]
+                        count += 1
+                        yield value
+                        continue
+
+            if eof:
+                if in_array:
+                    self.reject(count + 1, 'File JSON terpotong: array tidak ditutup dengan ]')
+                return
+            chunk = text.read(READ_SIZE)
+            if not chunk:
+                eof = True
+            buffer += chunk
@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import DeclarativeBase
+import logging
 import os
 
 class Base(DeclarativeBase):
@@ -8,37 +11,134 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+# How long a token without an expires_at stays valid
+LEGACY_TOKEN_LIFETIME = timedelta(hours=5)
+
+def token_owner(prefix, identifier):
+    """Owner of the tokens issued to one user, e.g. TG_<telegram id> or USER_<identifier>"""
+    return f"{prefix}_{identifier}"
+
 class AccessToken(db.Model):
     __tablename__ = 'access_tokens'
+    __table_args__ = (
+        db.Index('ix_access_tokens_owner_active', 'owner', 'is_active'),
+        db.Index('ix_access_tokens_active_created', 'is_active', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     token = db.Column(db.String(255), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
+    # Who the token was issued to, None for the built-in tokens
+    owner = db.Column(db.String(120))
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_used = db.Column(db.DateTime)
-    expires_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)
+    
+    def expiry_time(self):
+        """When the token stops being valid"""
+        if self.expires_at:
+            return self.expires_at
+        # For backward compatibility, tokens without an expiry last 5 hours
+        return self.created_at + LEGACY_TOKEN_LIFETIME
     
     def is_expired(self):
         """Check if token is expired"""
-        if self.expires_at:
-            return datetime.utcnow() > self.expires_at
-        # For backward compatibility, check if token is older than 5 hours
-        return datetime.utcnow() > (self.created_at + timedelta(hours=5))
+        return datetime.utcnow() > self.expiry_time()
     
     def __repr__(self):
         return f'<AccessToken {self.name}>'
 
+# Names given to user tokens before they had an owner: TG_<id> and USER_<identifier>_<YYYYmmdd_HHMMSS>
+_USER_TOKEN_SUFFIX_LENGTH = len('_20240101_000000')
+
+def _owner_from_name(name):
+    if name.startswith('TG_'):
+        return name
+    if name.startswith('USER_') and len(name) > len('USER_') + _USER_TOKEN_SUFFIX_LENGTH:
+        return name[:-_USER_TOKEN_SUFFIX_LENGTH]
+    return None
+
 class UserSession(db.Model):
     __tablename__ = 'user_sessions'
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(255), unique=True, nullable=False)
-    token_id = db.Column(db.Integer, db.ForeignKey('access_tokens.id'), nullable=False)
+    token_id = db.Column(db.Integer, db.ForeignKey('access_tokens.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     
     token = db.relationship('AccessToken', backref='sessions')
     
     def is_expired(self):
-        return datetime.utcnow() > self.expires_at
\ No newline at end of file
+        return datetime.utcnow() > self.expires_at
+
+class StoredWallets(db.Model):
+    """Imported wallets kept server-side for one user session (private keys included, encrypted by the store)"""
+    __tablename__ = 'stored_wallets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(255), unique=True, nullable=False)
+    wallets = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def is_expired(self):
+        return datetime.utcnow() > self.expires_at
+
+class MaintenanceLock(db.Model):
+    """Lease that lets one process at a time run a maintenance task, e.g. the expired row reaper"""
+    __tablename__ = 'maintenance_locks'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(255))
+    locked_until = db.Column(db.DateTime, nullable=False)
+
+def _has_column(table_name, column_name):
+    return column_name in {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+
+def _has_index(table_name, index_name):
+    return index_name in {index['name'] for index in inspect(db.engine).get_indexes(table_name)}
+
+def migrate_database():
+    """Bring tables created by an older version up to date: new columns, indexes and owners.
+    
+    db.create_all() only creates missing tables, so databases created before
+    a column or index existed are upgraded here. Safe to run on every startup,
+    including from several workers at once: a change another worker made first
+    is detected and skipped.
+    """
+    table = AccessToken.__table__
+    if not _has_column(table.name, 'owner'):
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN owner VARCHAR(120)'))
+            logging.info("Added owner column to access tokens")
+        except DBAPIError:
+            if not _has_column(table.name, 'owner'):
+                raise
+            logging.info("Owner column on access tokens was added by another worker")
+    
+    for model in (AccessToken, UserSession, StoredWallets):
+        for index in model.__table__.indexes:
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except DBAPIError:
+                if not _has_index(model.__table__.name, index.name):
+                    raise
+    
+    # Tokens issued before the column existed (or by an older instance still running)
+    unowned = AccessToken.query.filter(
+        AccessToken.owner.is_(None),
+        db.or_(AccessToken.name.startswith('TG_', autoescape=True),
+              AccessToken.name.startswith('USER_', autoescape=True))
+    ).all()
+    updated = 0
+    for token in unowned:
+        owner = _owner_from_name(token.name)
+        if owner:
+            token.owner = owner
+            updated += 1
+    if updated:
+        db.session.commit()
+        logging.info(f"Set owner on {updated} existing access tokens")
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from fee_engine import FeeQuote
+
+
+class NetworkContext:
+    """Chain data resolved once per batch send and shared by every wallet in it"""
+
+    def __init__(self, network_config: Dict[str, Any], recipient_address: str,
+                 sample_address: Optional[str] = None, refresh_interval: float = 0,
+                 speed: Optional[str] = None):
+        self.network_config = network_config
+        self.recipient_address = recipient_address
+        self.sample_address = sample_address
+        # Fee speed tier (slow, standard, fast), None uses the fee engine's default
+        self.speed = speed
+        # Seconds after which a long batch re-resolves gas data, 0 disables refreshing
+        self.refresh_interval = refresh_interval
+
+        self.chain_id = network_config.get('chain_id')
+        self.fees: Optional[FeeQuote] = None
+        # Most paid per gas unit (maxFeePerGas, or gasPrice on legacy chains)
+        self.gas_price: Optional[int] = None
+        self.base_fee: Optional[int] = None
+        self.gas_limit: Optional[int] = None
+        self.resolved_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        if not self.resolved_at:
+            return True
+        return bool(self.refresh_interval) and (time.monotonic() - self.resolved_at) >= self.refresh_interval
+
+    async def resolve(self, service) -> 'NetworkContext':
+        """Fetch chain id check, fees and gas limit concurrently"""
+        estimate = {'to': self.recipient_address, 'value': 1}  # Small value for estimation
+        if self.sample_address:
+            estimate['from'] = self.sample_address
+
+        _, fees, gas_limit = await asyncio.gather(
+            service.providers.ensure_ready_async(service.rpc, self.network_config),
+            service.fees.get_fees_async(self.network_config, self.speed),
+            service.estimate_gas_async(self.network_config, estimate)
+        )
+
+        self.fees = fees
+        self.gas_price = fees.cost_per_gas
+        # Base fee of the next block, None on chains without EIP-1559
+        self.base_fee = fees.base_fee
+        self.gas_limit = gas_limit
+        self.resolved_at = time.monotonic()
+        return self
+
+    async def get(self, service, refresh: bool = False) -> 'NetworkContext':
+        """Return the context, refreshing it first when the refresh interval has passed or refresh is set"""
+        if refresh:
+            async with self._lock:
+                await self.resolve(service)
+        elif self.is_stale():
+            async with self._lock:
+                # Another wallet may have refreshed while we waited for the lock
+                if self.is_stale():
+                    await self.resolve(service)
+        return self
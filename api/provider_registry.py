@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class ProviderEntry:
+    """Health state for one (rpc_url, chain_id) pair"""
+
+    def __init__(self, rpc_url: str, chain_id: Optional[int]):
+        self.rpc_url = rpc_url
+        self.chain_id = chain_id
+        self.healthy: Optional[bool] = None
+        self.last_checked = 0.0
+        self.last_used = time.monotonic()
+        self.last_error: Optional[str] = None
+
+    def is_fresh(self, health_ttl: float) -> bool:
+        return bool(self.healthy) and (time.monotonic() - self.last_checked) < health_ttl
+
+    def record_health(self, healthy: bool, error: Optional[str] = None):
+        self.healthy = healthy
+        self.last_error = error
+        self.last_checked = time.monotonic()
+
+
+class ProviderRegistry:
+    """Registry of providers per (rpc_url, chain_id), shared across wallets and requests"""
+
+    def __init__(self, health_ttl: Optional[float] = None, idle_timeout: Optional[float] = None):
+        self.health_ttl = health_ttl or float(os.environ.get("PROVIDER_HEALTH_TTL", 60))
+        self.idle_timeout = idle_timeout or float(os.environ.get("PROVIDER_IDLE_TIMEOUT", 600))
+        self._entries: Dict[Tuple[str, Optional[int]], ProviderEntry] = {}
+        self._lock = threading.Lock()
+
+    def get_entry(self, network_config: Dict[str, Any]) -> ProviderEntry:
+        """Get (or create) the entry for a network and mark it as used"""
+        rpc_url = network_config.get('rpc_url')
+        if not rpc_url:
+            raise ValueError("RPC URL is required")
+
+        chain_id = network_config.get('chain_id')
+        key = (str(rpc_url), int(chain_id) if chain_id is not None else None)
+
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = ProviderEntry(*key)
+                self._entries[key] = entry
+            entry.last_used = time.monotonic()
+            return entry
+
+    async def ensure_ready_async(self, rpc_client, network_config: Dict[str, Any]) -> ProviderEntry:
+        """Verify connectivity and chain id over async RPC, at most once per health TTL"""
+        entry = self.get_entry(network_config)
+        if entry.is_fresh(self.health_ttl):
+            return entry
+
+        try:
+            remote_chain_id = int(await rpc_client.call(entry.rpc_url, "eth_chainId"), 16)
+        except Exception as e:
+            entry.record_health(False, str(e))
+            raise ConnectionError(f"Failed to connect to {entry.rpc_url}: {e}")
+
+        if entry.chain_id is not None and remote_chain_id != entry.chain_id:
+            error = f"Chain ID mismatch: RPC reports {remote_chain_id}, expected {entry.chain_id}"
+            entry.record_health(False, error)
+            raise ValueError(error)
+
+        entry.record_health(True)
+        return entry
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if now - entry.last_used > self.idle_timeout:
+                logging.debug(f"Evicting idle provider {entry.rpc_url} (chain {entry.chain_id})")
+                del self._entries[key]
@@ -0,0 +1,168 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import exists, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, AccessToken, UserSession, StoredWallets, MaintenanceLock, LEGACY_TOKEN_LIFETIME
+
+LOCK_NAME = 'expired_row_reaper'
+
+
+class ExpiredRowReaper:
+    """Deletes expired sessions, access tokens and stored wallets in small batches.
+
+    Sessions and tokens are kept for `retention` after they expire, tokens
+    also while a session still points at them. Stored wallets hold private
+    keys and go as soon as they expire. Each run holds a lease in
+    maintenance_locks, so with several workers, instances or the bot process
+    running it only one of them reaps at a time.
+    """
+
+    def __init__(self, app, interval: Optional[float] = None, retention_hours: Optional[float] = None,
+                 batch_size: Optional[int] = None, lock_ttl: Optional[float] = None):
+        self.app = app
+        self.enabled = os.environ.get("REAPER_ENABLED", "1").lower() not in ("0", "false", "no")
+        self.interval = interval or float(os.environ.get("REAPER_INTERVAL", 300))
+        self.retention = timedelta(hours=retention_hours if retention_hours is not None else float(
+            os.environ.get("REAPER_RETENTION_HOURS", 24)))
+        self.batch_size = batch_size or int(os.environ.get("REAPER_BATCH_SIZE", 500))
+        self.lock_ttl = timedelta(seconds=lock_ttl or float(os.environ.get("REAPER_LOCK_TTL", 600)))
+
+        self.runs = 0
+        self.skipped = 0
+        self.removed = {'user_sessions': 0, 'access_tokens': 0, 'stored_wallets': 0}
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def holder(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        """Reap every `interval` seconds on a background thread (again in a forked worker)"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run_loop, name='reaper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_loop(self):
+        # Jittered, so instances started together don't all reach for the lock at once
+        while not self._stop.wait(self.interval * random.uniform(0.9, 1.1)):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Expired row reaper failed: {e}")
+
+    def run_once(self) -> Optional[Dict[str, int]]:
+        """Reap now. Returns rows removed per table, or None when another process holds the lock"""
+        with self.app.app_context():
+            started = time.monotonic()
+            try:
+                if not self._acquire():
+                    self.skipped += 1
+                    return None
+                try:
+                    removed = self._reap()
+                finally:
+                    self._release()
+            except Exception as e:
+                db.session.rollback()
+                self.last_error = str(e)
+                raise
+
+            self.runs += 1
+            self.last_run = datetime.utcnow()
+            self.last_duration = time.monotonic() - started
+            self.last_error = None
+            for table, count in removed.items():
+                self.removed[table] += count
+            if any(removed.values()):
+                logging.info(f"Expired row reaper removed {removed} in {self.last_duration:.2f}s")
+            return removed
+
+    def _acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            db.session.add(MaintenanceLock(name=LOCK_NAME, holder=self.holder, locked_until=now + self.lock_ttl))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+
+        # Take over the lease only if it has run out, in one conditional update
+        result = db.session.execute(
+            update(MaintenanceLock)
+            .where(MaintenanceLock.name == LOCK_NAME, MaintenanceLock.locked_until < now)
+            .values(holder=self.holder, locked_until=now + self.lock_ttl)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _release(self):
+        db.session.execute(
+            update(MaintenanceLock)
+            .where(MaintenanceLock.name == LOCK_NAME, MaintenanceLock.holder == self.holder)
+            .values(locked_until=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def _reap(self) -> Dict[str, int]:
+        now = datetime.utcnow()
+        cutoff = now - self.retention
+        unused = ~exists().where(UserSession.token_id == AccessToken.id)
+        return {
+            'stored_wallets': self._delete_in_batches(StoredWallets, StoredWallets.expires_at < now),
+            # Sessions first, so the tokens they pointed at can go in the same run
+            'user_sessions': self._delete_in_batches(UserSession, UserSession.expires_at < cutoff),
+            'access_tokens': (
+                self._delete_in_batches(AccessToken, AccessToken.expires_at < cutoff, unused)
+                # Issued tokens from before expires_at was set; built-in tokens have no owner and stay
+                + self._delete_in_batches(AccessToken, AccessToken.expires_at.is_(None), AccessToken.owner.isnot(None),
+                                          AccessToken.created_at < cutoff - LEGACY_TOKEN_LIFETIME, unused)
+            )
+        }
+
+    def _delete_in_batches(self, model, *criteria) -> int:
+        """DELETE matching rows batch_size at a time, committing each batch to keep locks short"""
+        total = 0
+        while not self._stop.is_set():
+            ids = [row.id for row in model.query.with_entities(model.id).filter(*criteria).limit(self.batch_size)]
+            if not ids:
+                break
+            model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            total += len(ids)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'removed_total': dict(self.removed),
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+            'retention_hours': self.retention.total_seconds() / 3600
+        }
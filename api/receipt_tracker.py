@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+PENDING = 'pending'
+CONFIRMED = 'confirmed'
+FAILED = 'failed'
+DROPPED = 'dropped'
+
+
+class ReceiptTracker:
+    """Watches broadcast transactions until they are mined or disappear from the node.
+
+    Each poll reads only eth_blockNumber. Receipts are fetched when a new block
+    has arrived, for every pending hash at once in a JSON-RPC batch. So a batch
+    of sends costs one receipt round trip per block, however many hashes it has.
+    """
+
+    def __init__(self, rpc_client, poll_interval: Optional[float] = None,
+                 drop_after_blocks: Optional[int] = None, timeout: Optional[float] = None):
+        self.rpc = rpc_client
+        self.poll_interval = poll_interval or float(os.environ.get("RECEIPT_POLL_INTERVAL", 2))
+        # Blocks without a receipt after which a hash the node no longer knows counts as dropped
+        self.drop_after_blocks = drop_after_blocks or int(os.environ.get("RECEIPT_DROP_BLOCKS", 25))
+        self.timeout = timeout or float(os.environ.get("RECEIPT_TIMEOUT", 600))
+
+    @staticmethod
+    def _update(tx_hash: str, status: str, receipt: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        update = {'tx_hash': tx_hash, 'confirmation': status, 'block_number': None, 'gas_used': None}
+        if receipt:
+            update['block_number'] = int(receipt['blockNumber'], 16) if receipt.get('blockNumber') else None
+            update['gas_used'] = int(receipt['gasUsed'], 16) if receipt.get('gasUsed') else None
+        return update
+
+    async def iter_receipts(self, network_config: Dict[str, Any], tx_hashes: List[str],
+                            should_cancel: Callable[[], bool] = None,
+                            timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield an update for each hash once it is confirmed, failed or dropped.
+
+        Hashes still unresolved at the timeout (or on cancel) are yielded as pending.
+        `timeout` overrides RECEIPT_TIMEOUT for this call.
+        """
+        rpc_url = str(network_config.get('rpc_url'))
+        pending = list(dict.fromkeys(tx_hashes))
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        start_block = None
+        last_block = None
+
+        while pending:
+            if time.monotonic() >= deadline or (should_cancel and should_cancel()):
+                break
+
+            try:
+                block = int(await self.rpc.call(rpc_url, "eth_blockNumber"), 16)
+            except Exception as e:
+                logging.warning(f"Receipt polling failed to read block number: {e}")
+                block = last_block
+
+            if block is not None and block != last_block:
+                if start_block is None:
+                    start_block = block
+                last_block = block
+
+                calls = [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in pending]
+                receipts = await self.rpc.batch(rpc_url, calls)
+
+                unresolved = []
+                for tx_hash, receipt in zip(pending, receipts):
+                    if isinstance(receipt, Exception) or not receipt:
+                        unresolved.append(tx_hash)
+                    elif receipt.get('status') == '0x0':
+                        yield self._update(tx_hash, FAILED, receipt)
+                    else:
+                        yield self._update(tx_hash, CONFIRMED, receipt)
+                pending = unresolved
+
+                if pending and block - start_block >= self.drop_after_blocks:
+                    async for update in self._check_dropped(rpc_url, list(pending)):
+                        pending.remove(update['tx_hash'])
+                        yield update
+
+            if pending:
+                await asyncio.sleep(self.poll_interval)
+
+        for tx_hash in pending:
+            yield self._update(tx_hash, PENDING)
+
+    async def _check_dropped(self, rpc_url: str, tx_hashes: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        calls = [("eth_getTransactionByHash", [tx_hash]) for tx_hash in tx_hashes]
+        transactions = await self.rpc.batch(rpc_url, calls)
+        for tx_hash, transaction in zip(tx_hashes, transactions):
+            # An error says nothing about the transaction, only a null result means it is gone
+            if transaction is None:
+                yield self._update(tx_hash, DROPPED)
+
+    async def track(self, network_config: Dict[str, Any], tx_hashes: List[str],
+                    on_update: Callable[[Dict[str, Any]], None] = None,
+                    should_cancel: Callable[[], bool] = None) -> Dict[str, Dict[str, Any]]:
+        """Wait for all hashes to resolve and return tx_hash -> update"""
+        updates = {}
+        async for update in self.iter_receipts(network_config, tx_hashes, should_cancel):
+            updates[update['tx_hash']] = update
+            if on_update:
+                on_update(update)
+        return updates
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import random
+from typing import Any, Awaitable, Callable, Optional
+
+import aiohttp
+
+from rate_limiter import is_rate_limit_error
+from rpc_client import RpcError
+
+# Node errors that say "not now" rather than "no": lagging or overloaded nodes
+TRANSIENT_RPC_ERRORS = ('header not found', 'unknown block', 'missing trie node', 'timeout', 'timed out',
+                        'temporarily unavailable', 'try again', 'service unavailable', 'bad gateway')
+# Broadcast answers meaning the node already has this exact signed transaction
+ALREADY_KNOWN_ERRORS = ('already known', 'known transaction', 'already imported', 'already in mempool')
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection failures, HTTP 5xx/429 and transient node errors.
+
+    Reverts, nonce and balance errors are final: sending again would fail the
+    same way (or worse, do something twice).
+    """
+    if isinstance(error, RpcError):
+        message = error.message.lower()
+        return is_rate_limit_error(message) or any(marker in message for marker in TRANSIENT_RPC_ERRORS)
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, ConnectionError))
+
+
+def is_already_known(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in ALREADY_KNOWN_ERRORS)
+
+
+class RetryBudget:
+    """Retries shared by one batch, so an outage can't multiply its traffic"""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+        self.used = 0
+
+    @classmethod
+    def for_batch(cls, size: int) -> 'RetryBudget':
+        ratio = float(os.environ.get("RETRY_BUDGET_RATIO", 0.2))
+        minimum = int(os.environ.get("RETRY_BUDGET_MIN", 10))
+        return cls(max(minimum, int(size * ratio)))
+
+    def spend(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        self.used += 1
+        return True
+
+
+class RetryPolicy:
+    """Retries transient failures with full-jitter exponential backoff"""
+
+    def __init__(self, max_attempts: Optional[int] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None):
+        self.max_attempts = max_attempts or int(os.environ.get("RETRY_MAX_ATTEMPTS", 3))
+        self.base_delay = base_delay or float(os.environ.get("RETRY_BASE_DELAY", 0.25))
+        self.max_delay = max_delay or float(os.environ.get("RETRY_MAX_DELAY", 5))
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def should_retry(self, error: Exception, attempt: int, budget: Optional[RetryBudget] = None) -> bool:
+        """Whether attempt number `attempt` (0-based) may be followed by another one"""
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            return False
+        return budget is None or budget.spend()
+
+    async def run(self, operation: Callable[[], Awaitable[Any]], budget: Optional[RetryBudget] = None,
+                  description: str = "RPC call") -> Any:
+        """Await operation(), calling it again after transient failures"""
+        attempt = 0
+        while True:
+            try:
+                return await operation()
+            except Exception as e:
+                if not self.should_retry(e, attempt, budget):
+                    raise
+                delay = self.backoff(attempt)
+                logging.info(f"{description} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
@@ -0,0 +1,119 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+WalletList = List[Dict[str, Any]]
+
+# Secrets shipped with the source; a key derived from one would protect nothing
+PUBLIC_SECRETS = frozenset({'dev-secret-key-change-in-production'})
+
+
+class MemoryWalletStore:
+    """In-process LRU store of imported wallets per session id, with a TTL"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries or int(os.environ.get("WALLET_STORE_MAX_SESSIONS", 1000))
+        self.ttl = ttl or float(os.environ.get("WALLET_STORE_TTL", 5 * 3600))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> WalletList:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return []
+            expires_at, wallets = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                return []
+            self._entries.move_to_end(key)
+            return wallets
+
+    def set(self, key: str, wallets: WalletList):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, wallets)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                logging.debug(f"Wallet store full, evicted session {evicted[:8]}...")
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _derive_fernet(secret: str) -> Fernet:
+    """Encryption key for stored wallets, derived from the app secret"""
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b'mws-wallet-store').derive(secret.encode())
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+class SqlWalletStore:
+    """Database-backed wallet store, for deployments whose instances don't share memory.
+
+    Wallets, private keys included, are kept in the stored_wallets table until
+    they expire, encrypted with a key derived from `secret` (WALLET_STORE_KEY,
+    else the session secret). Rows that no longer decrypt, e.g. after the
+    secret changed, are dropped and the user imports again.
+    """
+
+    def __init__(self, db, secret: str, ttl: Optional[float] = None):
+        from models import StoredWallets
+
+        self.db = db
+        self.model = StoredWallets
+        self.ttl = ttl or float(os.environ.get("WALLET_STORE_TTL", 5 * 3600))
+        self._fernet = _derive_fernet(os.environ.get("WALLET_STORE_KEY") or secret)
+
+    def get(self, key: str) -> WalletList:
+        row = self.model.query.filter_by(session_id=key).first()
+        if not row:
+            return []
+        if row.is_expired():
+            self.delete(key)
+            return []
+        try:
+            return json.loads(self._fernet.decrypt(row.wallets.encode()))
+        except InvalidToken:
+            logging.warning(f"Stored wallets for session {key[:8]}... can't be decrypted, dropping them")
+            self.delete(key)
+            return []
+
+    def set(self, key: str, wallets: WalletList):
+        row = self.model.query.filter_by(session_id=key).first()
+        if not row:
+            row = self.model()
+            row.session_id = key
+            self.db.session.add(row)
+        row.wallets = self._fernet.encrypt(json.dumps(wallets).encode()).decode()
+        row.expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        self.db.session.commit()
+
+    def delete(self, key: str):
+        self.model.query.filter_by(session_id=key).delete()
+        self.db.session.commit()
+
+
+def create_wallet_store(backend: Optional[str] = None, db=None, secret: Optional[str] = None):
+    """Build the wallet store selected by `backend` or the WALLET_STORE env var (memory or sql)"""
+    backend = (backend or os.environ.get("WALLET_STORE", "memory")).lower()
+    if backend == 'sql':
+        if db is None:
+            raise ValueError("SQL wallet store requires a database")
+        if not os.environ.get("WALLET_STORE_KEY") and (not secret or secret in PUBLIC_SECRETS):
+            logging.error("SQL wallet store refused: stored private keys would be encrypted with a public "
+                          "default secret. Set WALLET_STORE_KEY or SESSION_SECRET. Falling back to the "
+                          "in-memory wallet store, imported wallets are not shared between instances.")
+            return MemoryWalletStore()
+        return SqlWalletStore(db, secret)
+    return MemoryWalletStore()
@@ -1,13 +1,23 @@
 import os
+import json
+import atexit
 import logging
-import asyncio
 import secrets
+import time
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, stream_with_context
 from werkzeug.middleware.proxy_fix import ProxyFix
 from blockchain import BlockchainService
-from models import db, AccessToken, UserSession
+from sqlalchemy.orm import joinedload
+from models import db, AccessToken, UserSession, migrate_database, token_owner
+from auth_cache import AuthCache
+from reaper import ExpiredRowReaper
+from crypto_pool import iter_derive_addresses
+from key_parser import KeyFileParser
+from wallet_store import create_wallet_store
+from jobs import JobManager
+from async_runtime import AsyncRuntime
 from datetime import timedelta
 from email_service import send_token_notification, get_user_device_info
 
@@ -33,9 +43,18 @@ db.init_app(app)
 # Initialize blockchain service
 blockchain_service = BlockchainService()
 
+# Imported wallets live server-side, the session cookie only carries an id.
+# Workers and autoscaled instances don't share memory, so use the database when there is one
+wallet_store = create_wallet_store(
+    os.environ.get("WALLET_STORE") or ("sql" if app.config["SQLALCHEMY_DATABASE_URI"] else "memory"),
+    db=db,
+    secret=app.secret_key
+)
+
 # Create tables and default tokens
 with app.app_context():
     db.create_all()
+    migrate_database()
     
     # Create default tokens if they don't exist
     if not AccessToken.query.first():
@@ -54,6 +73,63 @@ with app.app_context():
         db.session.commit()
         logging.info("Default access tokens created")
 
+# One long-lived event loop for the process, so pooled RPC connections and caches
+# outlive the request that created them
+async_runtime = AsyncRuntime(on_stop=blockchain_service.close)
+atexit.register(async_runtime.stop)
+
+def run_async(coro):
+    """Run a blockchain coroutine on the shared background event loop"""
+    return async_runtime.run(coro)
+
+def iter_async(agen):
+    """Iterate an async generator on the shared background event loop"""
+    return async_runtime.iterate(agen)
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Recently validated sessions, so most requests skip the database
+auth_cache = AuthCache()
+
+# Deletes expired sessions, tokens and stored wallets; a database lease keeps it to one process at a time
+reaper = ExpiredRowReaper(app)
+if reaper.enabled:
+    reaper.start()
+atexit.register(reaper.stop)
+
+# Background workers for batch sends that shouldn't be tied to one request
+job_manager = JobManager(run_async, submitter=async_runtime.submit)
+
+# Autoscaled deployments freeze or swap instances between requests, so a job's thread
+# and in-memory state can't be relied on there; the UI streams the send instead
+BACKGROUND_JOBS = os.environ.get("BACKGROUND_JOBS", "0" if os.environ.get("REPLIT_DEPLOYMENT") else "1").lower() in ("1", "true", "yes")
+
+# Longest a streamed send may run, in seconds (0 = no limit). Receipt
+# tracking gets whatever is left after the results, so the stream ends on its own
+STREAM_TIME_LIMIT = float(os.environ.get("STREAM_TIME_LIMIT", 0))
+
+def stream_receipt_timeout(started):
+    """Seconds left for receipt tracking in a stream started at `started`, None without a limit"""
+    if not STREAM_TIME_LIMIT:
+        return None
+    return max(0.0, STREAM_TIME_LIMIT - (time.monotonic() - started))
+
+def get_wallet_store_key():
+    """Key of the current user's imported wallets in the wallet store"""
+    key = session.get('session_id') or session.get('wallet_key')
+    if not key:
+        key = session['wallet_key'] = secrets.token_urlsafe(32)
+    return key
+
 def require_auth(f):
     """Decorator to require authentication for routes"""
     @wraps(f)
@@ -69,23 +145,29 @@ def is_authenticated():
     if not session_id:
         return False
     
-    user_session = UserSession.query.filter_by(session_id=session_id).first()
+    if auth_cache.get(session_id):
+        return True
+    
+    # Session and token in one query
+    user_session = UserSession.query.options(joinedload(UserSession.token)).filter_by(session_id=session_id).first()
     if not user_session or user_session.is_expired():
         session.clear()
         return False
     
     # Also check if the underlying token is still valid
-    if user_session.token.is_expired():
+    token = user_session.token
+    if not token.is_active or token.is_expired():
         session.clear()
         return False
     
+    auth_cache.put(session_id, token.id, min(user_session.expires_at, token.expiry_time()))
     return True
 
 @app.route('/')
 def index():
     """Landing page or main app"""
     if is_authenticated():
-        return render_template('index.html')
+        return render_template('index.html', background_jobs=BACKGROUND_JOBS)
     else:
         # Show landing page for unauthenticated users
         return render_template('landing.html', bot_username='your_bot_username')
@@ -135,7 +217,9 @@ def logout():
     if session_id:
         UserSession.query.filter_by(session_id=session_id).delete()
         db.session.commit()
+        auth_cache.invalidate(session_id)
     
+    wallet_store.delete(get_wallet_store_key())
     session.clear()
     flash('Logout berhasil', 'info')
     return redirect(url_for('login'))
@@ -152,47 +236,45 @@ def import_keys():
         if file.filename == '':
             return jsonify({'error': 'Tidak ada file yang dipilih'}), 400
         
-        # Read file content
-        content = file.read().decode('utf-8')
-        private_keys = []
-        
-        # Parse private keys line by line
-        for line in content.strip().split('\n'):
-            line = line.strip()
-            if line:
-                # Remove 0x prefix if present
-                if line.startswith('0x'):
-                    line = line[2:]
-                
-                # Validate hex format (64 characters)
-                if len(line) == 64 and all(c in '0123456789abcdefABCDEF' for c in line):
-                    private_keys.append('0x' + line)
-                else:
-                    logging.warning(f"Invalid private key format: {line[:10]}...")
+        # Stream the upload line by line instead of reading it into memory
+        parser = KeyFileParser()
+        private_keys = parser.iter_keys(file.stream, file.filename)
         
-        if not private_keys:
-            return jsonify({'error': 'Tidak ditemukan private key yang valid dalam file'}), 400
+        # Generate wallet addresses (parallel across cores for large files)
+        def log_progress(done, total):
+            logging.debug(f"Derived {done} wallet addresses")
         
-        # Generate wallet addresses
         wallets = []
-        for pk in private_keys:
-            try:
-                address = blockchain_service.get_address_from_private_key(pk)
-                wallets.append({
-                    'private_key': pk,
-                    'address': address
-                })
-            except Exception as e:
-                logging.error(f"Error generating address for private key: {e}")
+        for line_no, pk, address, error in iter_derive_addresses(private_keys, progress=log_progress):
+            if error:
+                logging.error(f"Error generating address for private key on line {line_no}: {error}")
+                parser.reject(line_no, error)
                 continue
+            wallets.append({
+                'private_key': pk,
+                'address': address
+            })
+        
+        for diagnostic in parser.diagnostics:
+            unit = 'entry' if 'entry' in diagnostic else 'line'
+            logging.warning(f"Skipped {unit} {diagnostic[unit]} of key file: {diagnostic['error']}")
         
-        # Store in session (temporary, not persistent)
-        session['wallets'] = wallets
+        if not wallets:
+            return jsonify({
+                'error': 'Tidak ditemukan private key yang valid dalam file',
+                **parser.summary()
+            }), 400
+        
+        # Store server-side, keyed by the user session (temporary, expires with it)
+        wallet_store.set(get_wallet_store_key(), wallets)
         
         return jsonify({
             'success': True,
             'wallets': [{'address': w['address']} for w in wallets],
-            'count': len(wallets)
+            'count': len(wallets),
+            'invalid_count': parser.invalid_count,
+            'duplicate_count': parser.duplicate_count,
+            'diagnostics': parser.diagnostics
         })
         
     except Exception as e:
@@ -210,14 +292,15 @@ def get_balances():
         if not network_config:
             return jsonify({'error': 'Konfigurasi jaringan diperlukan'}), 400
         
-        wallets = session.get('wallets', [])
+        wallets = wallet_store.get(get_wallet_store_key())
         if not wallets:
             return jsonify({'error': 'Tidak ada wallet yang diimpor'}), 400
         
         # Get balances for all wallets
-        balances = asyncio.run(blockchain_service.get_balances_async(
+        balances = run_async(blockchain_service.get_balances_async(
             [w['address'] for w in wallets], 
-            network_config
+            network_config,
+            use_cache=not data.get('refresh')
         ))
         
         return jsonify({
@@ -242,13 +325,13 @@ def send_transactions():
         if not all([network_config, percentage, recipient_address]):
             return jsonify({'error': 'Parameter yang diperlukan tidak lengkap'}), 400
         
-        wallets = session.get('wallets', [])
+        wallets = wallet_store.get(get_wallet_store_key())
         if not wallets:
             return jsonify({'error': 'Tidak ada wallet yang diimpor'}), 400
         
         # Send transactions
-        results = asyncio.run(blockchain_service.send_transactions_async(
-            wallets, network_config, percentage, recipient_address
+        results = run_async(blockchain_service.send_transactions_async(
+            wallets, network_config, percentage, recipient_address, speed=data.get('speed')
         ))
         
         return jsonify({
@@ -260,10 +343,148 @@ def send_transactions():
         logging.error(f"Error sending transactions: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/get_balances/stream', methods=['POST'])
+@require_auth
+def stream_balances():
+    """Stream each wallet's balance as a Server-Sent Event as soon as it is read"""
+    data = request.get_json()
+    network_config = data.get('network')
+    
+    if not network_config:
+        return jsonify({'error': 'Konfigurasi jaringan diperlukan'}), 400
+    
+    wallets = wallet_store.get(get_wallet_store_key())
+    if not wallets:
+        return jsonify({'error': 'Tidak ada wallet yang diimpor'}), 400
+    
+    addresses = [w['address'] for w in wallets]
+    
+    def events():
+        yield sse_event({'total': len(addresses)}, event='start')
+        try:
+            for balance in iter_async(blockchain_service.iter_balances_async(
+                addresses, network_config, use_cache=not data.get('refresh')
+            )):
+                yield sse_event(balance, event='balance')
+            yield sse_event({'success': True}, event='done')
+        except Exception as e:
+            logging.error(f"Error streaming balances: {e}")
+            yield sse_event({'error': str(e)}, event='error')
+    
+    return sse_response(events())
+
+@app.route('/send_transactions/stream', methods=['POST'])
+@require_auth
+def stream_send_transactions():
+    """Stream each wallet's transaction result as a Server-Sent Event as soon as it is ready"""
+    data = request.get_json()
+    network_config = data.get('network')
+    percentage = data.get('percentage')
+    recipient_address = data.get('recipient_address')
+    
+    if not all([network_config, percentage, recipient_address]):
+        return jsonify({'error': 'Parameter yang diperlukan tidak lengkap'}), 400
+    
+    wallets = wallet_store.get(get_wallet_store_key())
+    if not wallets:
+        return jsonify({'error': 'Tidak ada wallet yang diimpor'}), 400
+    
+    def events():
+        started = time.monotonic()
+        yield sse_event({'total': len(wallets)}, event='start')
+        try:
+            tx_hashes = []
+            for result in iter_async(blockchain_service.iter_send_transactions_async(
+                wallets, network_config, percentage, recipient_address, speed=data.get('speed')
+            )):
+                if result['tx_hash']:
+                    tx_hashes.append(result['tx_hash'])
+                yield sse_event(result, event='result')
+            for update in iter_async(blockchain_service.iter_receipts_async(
+                network_config, tx_hashes, timeout=stream_receipt_timeout(started)
+            )):
+                yield sse_event(update, event='receipt')
+            yield sse_event({'success': True}, event='done')
+        except Exception as e:
+            logging.error(f"Error streaming transactions: {e}")
+            yield sse_event({'error': str(e)}, event='error')
+    
+    return sse_response(events())
+
+@app.route('/jobs/send_transactions', methods=['POST'])
+@require_auth
+def submit_send_transactions_job():
+    """Queue a batch send in the background and return its job id right away"""
+    try:
+        data = request.get_json()
+        network_config = data.get('network')
+        percentage = data.get('percentage')
+        recipient_address = data.get('recipient_address')
+        
+        if not all([network_config, percentage, recipient_address]):
+            return jsonify({'error': 'Parameter yang diperlukan tidak lengkap'}), 400
+        
+        wallets = wallet_store.get(get_wallet_store_key())
+        if not wallets:
+            return jsonify({'error': 'Tidak ada wallet yang diimpor'}), 400
+        
+        async def work(job):
+            return await blockchain_service.send_transactions_async(
+                wallets, network_config, percentage, recipient_address,
+                speed=data.get('speed'),
+                on_result=job.add_result,
+                should_cancel=lambda: job.cancel_requested
+            )
+        
+        async def track_receipts(job, results):
+            # Keep the job running until the broadcast transactions are mined or dropped
+            await blockchain_service.track_receipts_async(
+                network_config,
+                [result['tx_hash'] for result in results if result['tx_hash']],
+                on_update=job.set_confirmation,
+                should_cancel=lambda: job.cancel_requested
+            )
+        
+        job = job_manager.submit('send_transactions', get_wallet_store_key(), len(wallets), work,
+                                 follow_up=track_receipts)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'total': job.total
+        }), 202
+        
+    except Exception as e:
+        logging.error(f"Error submitting send job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_job(job_id):
+    """Job status and the results from ?offset= on"""
+    job = job_manager.get(job_id, get_wallet_store_key())
+    if not job:
+        return jsonify({'error': 'Job tidak ditemukan'}), 404
+    
+    offset = request.args.get('offset', 0, type=int)
+    return jsonify({'success': True, **job.to_dict(offset=max(offset, 0))})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+@require_auth
+def cancel_job(job_id):
+    """Stop a job from starting any more wallets"""
+    job = job_manager.get(job_id, get_wallet_store_key())
+    if not job:
+        return jsonify({'error': 'Job tidak ditemukan'}), 404
+    
+    job.cancel()
+    return jsonify({'success': True, 'status': job.status})
+
 @app.route('/clear_session', methods=['POST'])
 @require_auth
 def clear_session():
     """Clear session data (wallets)"""
+    wallet_store.delete(get_wallet_store_key())
     session.clear()
     return jsonify({'success': True})
 
@@ -283,10 +504,8 @@ def request_token():
         
         try:
             # Deactivate old tokens for this user
-            old_tokens = AccessToken.query.filter(
-                AccessToken.name.like(f'USER_{user_identifier}_%'),
-                AccessToken.is_active == True
-            ).all()
+            owner = token_owner('USER', user_identifier)
+            old_tokens = AccessToken.query.filter_by(owner=owner, is_active=True).all()
             
             for old_token in old_tokens:
                 old_token.is_active = False
@@ -298,6 +517,7 @@ def request_token():
             token_record = AccessToken()
             token_record.token = new_token
             token_record.name = f'USER_{user_identifier}_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}'
+            token_record.owner = owner
             token_record.is_active = True
             token_record.created_at = datetime.utcnow()
             token_record.expires_at = datetime.utcnow() + timedelta(hours=5)
@@ -305,6 +525,10 @@ def request_token():
             db.session.add(token_record)
             db.session.commit()
             
+            # Only after the commit, so a concurrent check can't re-cache the old state
+            for old_token in old_tokens:
+                auth_cache.invalidate_token(old_token.id)
+            
             # Send notification email with device info
             try:
                 device_info = get_user_device_info(request)
@@ -362,5 +586,32 @@ def view_tokens():
         } for token in tokens]
     })
 
+# Bearer token that may trigger the reaper over HTTP (e.g. from a cron job); unset disables it
+REAPER_TOKEN = os.environ.get("REAPER_TOKEN")
+
+def has_reaper_token():
+    """Whether the request carries REAPER_TOKEN as a bearer token"""
+    supplied = request.headers.get('Authorization', '')
+    return bool(REAPER_TOKEN) and secrets.compare_digest(supplied.encode(), f"Bearer {REAPER_TOKEN}".encode())
+
+@app.route('/admin/reaper', methods=['GET'])
+@require_auth
+def reaper_stats():
+    """Expired row reaper metrics for signed-in users"""
+    return jsonify(reaper.stats())
+
+@app.route('/admin/reaper', methods=['POST'])
+def run_reaper():
+    """Run the reaper now (e.g. from a cron job on serverless hosts); needs REAPER_TOKEN, not a user token"""
+    if not has_reaper_token():
+        return jsonify({'error': 'Tidak diizinkan'}), 403
+    
+    try:
+        removed = reaper.run_once()
+    except Exception as e:
+        logging.error(f"Expired row reaper failed: {e}")
+        return jsonify({'error': str(e), **reaper.stats()}), 500
+    return jsonify({'removed': removed, 'locked': removed is None, **reaper.stats()})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
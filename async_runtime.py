@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+
+class AsyncRuntime:
+    """Long-lived event loop on a background thread that request handlers submit coroutines to.
+
+    Keeping one loop for the life of the process lets pooled connections, caches
+    and coalesced in-flight calls carry over from one request to the next.
+    """
+
+    def __init__(self, on_stop: Optional[Callable[[], Awaitable[Any]]] = None):
+        # on_stop() is awaited on the loop before it shuts down, e.g. to close pooled sessions
+        self.on_stop = on_stop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running background loop, started on first use (and again in a forked worker)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run_loop, args=(self._loop,),
+                                                name='async-runtime', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Schedule a coroutine on the background loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the background loop and block until it finishes"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """Iterate an async generator from sync code, e.g. a streaming response"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            self.run(agen.aclose())
+
+    def stop(self, timeout: float = 10):
+        """Run the on_stop hook, then stop the loop thread"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or self._pid != os.getpid() or not thread.is_alive():
+                return
+            self._loop = None
+
+        if self.on_stop:
+            try:
+                asyncio.run_coroutine_threadsafe(self.on_stop(), loop).result(timeout)
+            except Exception as e:
+                logging.warning(f"Error stopping async runtime: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
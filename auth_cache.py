@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+class AuthCache:
+    """Short-lived cache of authenticated sessions per session_id.
+
+    An entry stands for "this session and its token were valid when checked"
+    and is served until the TTL passes or the session/token expiry is reached,
+    whichever comes first. Logout and token deactivation drop entries right
+    away; other processes (the Telegram bot) are bounded by the TTL.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get("AUTH_CACHE_TTL", 30))
+        self.max_entries = max_entries or int(os.environ.get("AUTH_CACHE_SIZE", 10000))
+        # session_id -> (token_id, valid_until (utc), cached_at (monotonic))
+        self._entries: "OrderedDict[str, Tuple[int, datetime, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> bool:
+        """Whether the session is known to be valid without asking the database"""
+        if self.ttl <= 0:
+            return False
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return False
+            _, valid_until, cached_at = entry
+            if time.monotonic() - cached_at >= self.ttl or datetime.utcnow() > valid_until:
+                del self._entries[session_id]
+                return False
+            self._entries.move_to_end(session_id)
+            return True
+
+    def put(self, session_id: str, token_id: int, valid_until: datetime):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[session_id] = (token_id, valid_until, time.monotonic())
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def invalidate_token(self, token_id: int):
+        """Drop every session logged in with the token"""
+        with self._lock:
+            for session_id in [key for key, entry in self._entries.items() if entry[0] == token_id]:
+                del self._entries[session_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
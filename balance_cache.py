@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class CachedBalance:
+    def __init__(self, balance_wei: int, block_number: Optional[int]):
+        self.balance_wei = balance_wei
+        # Block the balance was read at, None when the read wasn't pinned to a block
+        self.block_number = block_number
+        self.cached_at = time.monotonic()
+
+
+class BalanceCache:
+    """LRU cache of balances per (source, chain_id, address).
+
+    `source` names the RPC endpoints a balance was read from. The network
+    config comes from the client, so a balance is only served to requests
+    that read from the same endpoints; a session pointing its own node at a
+    chain id can't fill the entries other sessions read.
+
+    An entry is served while it is younger than the TTL, or, past the TTL,
+    while the chain is at most `max_block_lag` blocks ahead of the block it was
+    read at. Sends from or to an address invalidate its entries from every
+    source, at broadcast and again once the transaction is mined or dropped.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 max_block_lag: Optional[int] = None):
+        self.max_entries = max_entries or int(os.environ.get("BALANCE_CACHE_SIZE", 10000))
+        self.ttl = ttl if ttl is not None else float(os.environ.get("BALANCE_CACHE_TTL", 15))
+        self.max_block_lag = max_block_lag if max_block_lag is not None else int(
+            os.environ.get("BALANCE_CACHE_BLOCK_LAG", 0))
+        self._entries: "OrderedDict[Tuple[Hashable, int, str], CachedBalance]" = OrderedDict()
+        # (chain_id, address) -> sources with an entry for it, so invalidation covers all of them
+        self._sources: Dict[Tuple[int, str], Set[Hashable]] = {}
+        # tx hash -> (chain_id, addresses) of broadcast transactions not yet resolved
+        self._transactions: "OrderedDict[str, Tuple[int, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(source: Hashable, chain_id: int, address: str) -> Tuple[Hashable, int, str]:
+        return source, int(chain_id), address.lower()
+
+    def _pop(self, key: Tuple[Hashable, int, str]):
+        source, chain_id, address = key
+        self._entries.pop(key, None)
+        sources = self._sources.get((chain_id, address))
+        if sources is not None:
+            sources.discard(source)
+            if not sources:
+                del self._sources[(chain_id, address)]
+
+    def _is_fresh(self, entry: CachedBalance, current_block: Optional[int]) -> bool:
+        if time.monotonic() - entry.cached_at < self.ttl:
+            return True
+        return (current_block is not None and entry.block_number is not None
+                and current_block - entry.block_number <= self.max_block_lag)
+
+    def get_many(self, source: Hashable, chain_id: int, addresses: Iterable[str],
+                 current_block: Optional[int] = None) -> Dict[str, CachedBalance]:
+        """Fresh entries read from `source` for the given addresses, keyed by address as passed in"""
+        hits = {}
+        with self._lock:
+            for address in addresses:
+                key = self._key(source, chain_id, address)
+                entry = self._entries.get(key)
+                if entry is not None and self._is_fresh(entry, current_block):
+                    self._entries.move_to_end(key)
+                    hits[address] = entry
+        return hits
+
+    def has_block_pinned(self, source: Hashable, chain_id: int, addresses: Iterable[str]) -> bool:
+        """Whether any of the addresses has an entry a current block number could revalidate"""
+        if not self.max_block_lag:
+            return False
+        with self._lock:
+            return any(getattr(self._entries.get(self._key(source, chain_id, address)), 'block_number', None)
+                       is not None for address in addresses)
+
+    def put(self, source: Hashable, chain_id: int, address: str, balance_wei: int,
+            block_number: Optional[int] = None):
+        key = self._key(source, chain_id, address)
+        with self._lock:
+            self._entries[key] = CachedBalance(balance_wei, block_number)
+            self._entries.move_to_end(key)
+            self._sources.setdefault(key[1:], set()).add(source)
+            while len(self._entries) > self.max_entries:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, chain_id: int, addresses: List[str]):
+        """Drop the addresses' entries from every source"""
+        with self._lock:
+            for address in addresses:
+                _, chain, addr = self._key(None, chain_id, address)
+                for source in list(self._sources.get((chain, addr), ())):
+                    self._pop((source, chain, addr))
+
+    def watch_transaction(self, tx_hash: str, chain_id: int, addresses: List[str]):
+        """Remember whose balances tx_hash changes, for invalidate_transaction"""
+        with self._lock:
+            self._transactions[tx_hash.lower()] = (chain_id, list(addresses))
+            while len(self._transactions) > self.max_entries:
+                self._transactions.popitem(last=False)
+
+    def invalidate_transaction(self, tx_hash: str):
+        """Drop the balances a resolved transaction touched; reads while it was pending are stale now"""
+        with self._lock:
+            entry = self._transactions.pop(tx_hash.lower(), None)
+            if entry is None:
+                return
+            chain_id, addresses = entry
+        self.invalidate(chain_id, addresses)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sources.clear()
+            self._transactions.clear()
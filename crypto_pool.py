@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from eth_account import Account
+
+# Inputs smaller than this are derived inline, a process round trip would cost more than it saves
+PARALLEL_THRESHOLD = int(os.environ.get("KEY_DERIVATION_PARALLEL_THRESHOLD", 500))
+CHUNK_SIZE = int(os.environ.get("KEY_DERIVATION_CHUNK_SIZE", 1000))
+MAX_WORKERS = int(os.environ.get("KEY_DERIVATION_WORKERS", os.cpu_count() or 1))
+# Batches smaller than this are signed inline, larger ones in chunks across the pool
+SIGNING_PARALLEL_THRESHOLD = int(os.environ.get("SIGNING_PARALLEL_THRESHOLD", 64))
+SIGNING_CHUNK_SIZE = int(os.environ.get("SIGNING_CHUNK_SIZE", 50))
+
+# What the pool hands back for a signed transaction, the parts a broadcast needs
+SignedTransaction = namedtuple('SignedTransaction', ['raw_transaction', 'hash'])
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Account helper reused by every task a worker process runs
+_account: Optional[Account] = None
+
+
+def _init_worker():
+    global _account
+    _account = Account()
+
+
+def _derive_chunk(chunk: List[Tuple[int, str]]) -> List[Tuple[int, str, Optional[str], Optional[str]]]:
+    """Derive (line, key, address, error) for each (line, key) pair"""
+    account = _account or Account()
+    results = []
+    for line_no, private_key in chunk:
+        try:
+            results.append((line_no, private_key, account.from_key(private_key).address, None))
+        except Exception as e:
+            results.append((line_no, private_key, None, str(e)))
+    return results
+
+
+def _sign_chunk(chunk: List[Tuple[Dict[str, Any], str]]) -> List[Tuple[Optional[SignedTransaction], Optional[str]]]:
+    """Sign each (transaction, private_key) pair, returning (signed, error)"""
+    account = _account or Account()
+    results = []
+    for transaction, private_key in chunk:
+        try:
+            signed = account.sign_transaction(transaction, private_key)
+            results.append((SignedTransaction(bytes(signed.raw_transaction), bytes(signed.hash)), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+def _mp_context():
+    """Start workers from a clean process; forking the web server would copy its threads and locks"""
+    try:
+        context = multiprocessing.get_context('forkserver')
+        # The default preload is __main__, which would import the whole web app into the fork server
+        context.set_forkserver_preload([__name__])
+        return context
+    except ValueError:
+        # No forkserver on this platform (e.g. Windows)
+        return multiprocessing.get_context('spawn')
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """Get the shared process pool, or None when processes can't be used here"""
+    global _executor
+    if MAX_WORKERS <= 1:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            try:
+                _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=_mp_context(),
+                                                initializer=_init_worker)
+            except (OSError, NotImplementedError, ImportError) as e:
+                # Some serverless runtimes have no shared memory for process pools
+                logging.warning(f"Process pool unavailable, running inline: {e}")
+                return None
+        return _executor
+
+
+def _reset_executor(broken: Optional[ProcessPoolExecutor] = None):
+    """Drop the shared pool, or only `broken` if it is still the shared one"""
+    global _executor
+    with _executor_lock:
+        if broken is not None and _executor is not broken:
+            # Another request already replaced it
+            return
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _iter_chunks(items: Iterable[Tuple[int, str]], size: int) -> Iterator[List[Tuple[int, str]]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_derive_addresses(items: Iterable[Tuple[int, str]], chunk_size: Optional[int] = None,
+                          progress: Optional[Callable[[int, Optional[int]], None]] = None
+                          ) -> Iterator[Tuple[int, str, Optional[str], Optional[str]]]:
+    """Derive addresses for (line, private_key) pairs, in order, across all cores.
+
+    `items` may be any iterable, including a streaming parser; only a bounded
+    window of chunks is in flight at a time. Yields (line, private_key,
+    address, error) tuples as chunks complete and calls progress(done, total)
+    after every chunk, with total None when the input length is unknown.
+    """
+    size = chunk_size or CHUNK_SIZE
+    total = len(items) if hasattr(items, '__len__') else None
+    if total is None:
+        # Peek far enough into a stream to tell whether it reaches the threshold
+        iterator = iter(items)
+        head = list(islice(iterator, PARALLEL_THRESHOLD))
+        small = len(head) < PARALLEL_THRESHOLD
+        items = chain(head, iterator)
+    else:
+        small = total < PARALLEL_THRESHOLD
+    chunks = _iter_chunks(items, size)
+    done = 0
+
+    # Small inputs aren't worth a process round trip
+    executor = None if small else get_executor()
+    # Chunks taken from the input and not yet yielded, with the futures submitted for them
+    pending = deque()
+    futures = deque()
+    if executor is not None:
+        window = MAX_WORKERS * 2
+        try:
+            for chunk in chunks:
+                # Queued before submitting, so a chunk the pool refuses still reaches the inline path
+                pending.append(chunk)
+                futures.append(executor.submit(_derive_chunk, chunk))
+                if len(pending) < window:
+                    continue
+                chunk_results = futures[0].result()
+                pending.popleft()
+                futures.popleft()
+                done += len(chunk_results)
+                if progress:
+                    progress(done, total)
+                yield from chunk_results
+
+            while pending:
+                chunk_results = futures[0].result()
+                pending.popleft()
+                futures.popleft()
+                done += len(chunk_results)
+                if progress:
+                    progress(done, total)
+                yield from chunk_results
+            return
+        except (BrokenProcessPool, RuntimeError) as e:
+            # RuntimeError: another request shut the pool down after we got it
+            logging.error(f"Key derivation pool unavailable, continuing inline: {e}")
+            _reset_executor(executor)
+
+    # Inline path, also picks up chunks a crashed pool never finished
+    for chunk in chain(pending, chunks):
+        chunk_results = _derive_chunk(chunk)
+        done += len(chunk_results)
+        if progress:
+            progress(done, total)
+        yield from chunk_results
+
+
+async def sign_transactions_async(items: List[Tuple[Dict[str, Any], str]],
+                                  chunk_size: Optional[int] = None
+                                  ) -> List[Tuple[Optional[SignedTransaction], Optional[str]]]:
+    """Sign (transaction, private_key) pairs off the event loop, in order.
+
+    Large batches are split into chunks and signed across the process pool, so
+    throughput scales with cores. Without a pool they are signed on a thread,
+    which still keeps the loop serving other requests between chunks.
+    """
+    if len(items) < SIGNING_PARALLEL_THRESHOLD:
+        return _sign_chunk(items)
+
+    size = chunk_size or SIGNING_CHUNK_SIZE
+    chunks = list(_iter_chunks(items, size))
+    loop = asyncio.get_running_loop()
+
+    executor = get_executor()
+    if executor is not None:
+        try:
+            chunk_results = await asyncio.gather(*[loop.run_in_executor(executor, _sign_chunk, chunk)
+                                                   for chunk in chunks])
+            return [result for chunk in chunk_results for result in chunk]
+        except (BrokenProcessPool, RuntimeError) as e:
+            # RuntimeError: another request shut the pool down after we got it
+            logging.error(f"Signing pool unavailable, continuing on a thread: {e}")
+            _reset_executor(executor)
+
+    results = []
+    for chunk in chunks:
+        results.extend(await asyncio.to_thread(_sign_chunk, chunk))
+    return results
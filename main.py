@@ -1,4 +1,22 @@
-from app import app
+import os
+
+# Pool worker processes re-import this file as __mp_main__; they must not build the web app
+if __name__ != '__mp_main__':
+    import app as web
+
+    # APP_MODE=asgi serves the RPC-bound routes as coroutines; run it under an ASGI
+    # server, e.g. gunicorn -k uvicorn.workers.UvicornWorker main:app
+    ASGI_MODE = os.environ.get("APP_MODE", "wsgi").lower() == "asgi"
+
+    if ASGI_MODE:
+        from asgi import create_asgi_app
+        app = create_asgi_app(web)
+    else:
+        app = web.app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if ASGI_MODE:
+        import uvicorn
+        uvicorn.run(app, host='0.0.0.0', port=5000)
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# Broadcast errors that mean our idea of the account's next nonce is wrong
+NONCE_ERRORS = ('nonce too low', 'nonce too high', 'replacement transaction underpriced',
+                'invalid nonce', 'nonce has already been used')
+
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in NONCE_ERRORS)
+
+
+class NonceState:
+    """Locally tracked nonces for one (chain_id, address)"""
+
+    def __init__(self):
+        self.next_nonce: Optional[int] = None
+        # Reserved nonces not yet confirmed or released -> when they were reserved
+        self.in_flight: Dict[int, float] = {}
+        self.last_used = 0.0
+        self.lock = asyncio.Lock()
+
+
+class NonceManager:
+    """Hands out nonces per (chain_id, address) without a node round trip for every send.
+
+    The first reservation for an account reads its `pending` transaction count.
+    After that, nonces come from a local counter, so several transfers from one
+    wallet, in one batch or in back-to-back batches, can be pipelined without
+    colliding. A nonce-related broadcast error or an idle period makes the
+    next reservation read the count from the node again.
+    """
+
+    def __init__(self, idle_resync: Optional[float] = None):
+        self.idle_resync = idle_resync or float(os.environ.get("NONCE_RESYNC_AFTER", 300))
+        self._states: Dict[Tuple[int, str], NonceState] = {}
+        self._loop = None
+
+    def _state(self, chain_id: int, address: str) -> NonceState:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio locks belong to one loop, start over on a new one
+            self._states = {}
+            self._loop = loop
+        key = (int(chain_id), address.lower())
+        if key not in self._states:
+            self._states[key] = NonceState()
+        return self._states[key]
+
+    def needs_sync(self, chain_id: int, address: str) -> bool:
+        """Whether the next reservation will read the pending count from the node"""
+        state = self._state(chain_id, address)
+        if state.next_nonce is None:
+            return True
+        now = time.monotonic()
+        if now - state.last_used <= self.idle_resync:
+            return False
+        # Reservations older than the idle window were abandoned, they must not block the resync
+        return all(now - reserved_at > self.idle_resync for reserved_at in state.in_flight.values())
+
+    async def reserve(self, chain_id: int, address: str, fetch_pending: Callable[[], Awaitable[int]]) -> int:
+        """Reserve the next nonce, reading the pending count from the node when not in sync"""
+        state = self._state(chain_id, address)
+        async with state.lock:
+            if self.needs_sync(chain_id, address):
+                state.next_nonce = await fetch_pending()
+                now = time.monotonic()
+                state.in_flight = {nonce: reserved_at for nonce, reserved_at in state.in_flight.items()
+                                   if now - reserved_at <= self.idle_resync}
+
+            nonce = state.next_nonce
+            state.next_nonce += 1
+            state.last_used = time.monotonic()
+            state.in_flight[nonce] = state.last_used
+            return nonce
+
+    def confirm(self, chain_id: int, address: str, nonce: int):
+        """The node accepted the transaction using `nonce`"""
+        self._state(chain_id, address).in_flight.pop(nonce, None)
+
+    def release(self, chain_id: int, address: str, nonce: int, resync: bool = False):
+        """The transaction using `nonce` was never accepted; hand the nonce back or resync"""
+        state = self._state(chain_id, address)
+        state.in_flight.pop(nonce, None)
+        if resync:
+            state.next_nonce = None
+        elif state.next_nonce == nonce + 1:
+            # Nothing was reserved after it, so it can simply be reused
+            state.next_nonce = nonce
+        else:
+            # A gap would block later transactions, read the real count again
+            state.next_nonce = None
+
+    def abandon(self, chain_id: int, address: str, nonce: int):
+        """Give up on `nonce` if it is still reserved, e.g. when its send was cancelled.
+
+        Whether it reached the node is unknown, so the next reservation resyncs.
+        """
+        if nonce in self._state(chain_id, address).in_flight:
+            self.release(chain_id, address, nonce, resync=True)
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+# JSON-RPC error messages providers use for throttling behind an HTTP 200
+RATE_LIMIT_MARKERS = ('rate limit', 'too many requests', 'request limit', 'exceeded the quota')
+
+
+def is_rate_limit_error(error: Any) -> bool:
+    message = str(error.get('message', error) if isinstance(error, dict) else error).lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Token bucket plus AIMD concurrency window for one RPC endpoint.
+
+    Until the endpoint first throttles us there is no rate cap, only the
+    concurrency window. A throttle (HTTP 429 or a rate limit JSON-RPC error)
+    halves the window, caps the rate at half of what was just being sent, and
+    pauses the endpoint for Retry-After. Every success grows both back
+    additively, so throughput settles just below the provider's limit.
+    """
+
+    def __init__(self, max_concurrency: int, rate: Optional[float] = None, min_rate: float = 1.0,
+                 rate_step: float = 1.0, decrease: float = 0.5, default_backoff: float = 1.0):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        # Requests per second, None while the endpoint has never throttled us
+        self.rate = rate
+        self.min_rate = min_rate
+        # How much the rate grows per second of successful requests
+        self.rate_step = rate_step
+        self.decrease = decrease
+        self.default_backoff = default_backoff
+
+        self.tokens = rate or 0.0
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.throttle_count = 0
+        self._refilled_at = time.monotonic()
+        # Requests sent in the current and previous one-second windows, to estimate the send rate
+        self._window_start = int(time.monotonic())
+        self._window_count = 0
+        self._previous_count = 0
+        self._loop = None
+        self._released: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # asyncio primitives belong to one loop, start over on a new one
+            self._loop = loop
+            self._released = asyncio.Condition()
+            self.in_flight = 0
+        return self._released
+
+    def _refill(self, now: float):
+        if self.rate is not None:
+            capacity = max(self.rate, 1.0)
+            self.tokens = min(capacity, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _count_request(self, now: float):
+        window = int(now)
+        if window != self._window_start:
+            self._previous_count = self._window_count if window == self._window_start + 1 else 0
+            self._window_start = window
+            self._window_count = 0
+        self._window_count += 1
+
+    def observed_rate(self) -> float:
+        return float(max(self._previous_count, self._window_count))
+
+    async def acquire(self):
+        """Wait for the pause to end, a free slot in the window and a rate token"""
+        released = self._condition()
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+
+            if self.in_flight >= max(1, int(self.limit)):
+                async with released:
+                    try:
+                        await asyncio.wait_for(released.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+
+            self._refill(now)
+            if self.rate is not None and self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            if self.rate is not None:
+                self.tokens -= 1
+            self.in_flight += 1
+            self._count_request(now)
+            return
+
+    async def release(self, throttled: bool = False, retry_after: Optional[float] = None) -> bool:
+        """Finish a request; throttled=True when the endpoint pushed back. True if limits were cut"""
+        self.in_flight = max(0, self.in_flight - 1)
+        cut = self.on_throttle(retry_after) if throttled else self.on_success()
+        released = self._condition()
+        async with released:
+            released.notify()
+        return bool(cut)
+
+    def on_success(self):
+        self.limit = min(self.max_concurrency, self.limit + 1 / max(self.limit, 1))
+        if self.rate is not None:
+            self.rate += self.rate_step / max(self.rate, 1)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> bool:
+        now = time.monotonic()
+        pause = retry_after if retry_after is not None else self.default_backoff
+        self.throttle_count += 1
+        if now < self.blocked_until:
+            # Requests already in flight when the first throttle hit, don't cut again
+            self.blocked_until = max(self.blocked_until, now + pause)
+            return False
+        self.limit = max(1.0, self.limit * self.decrease)
+        current = self.rate if self.rate is not None else self.observed_rate()
+        self.rate = max(self.min_rate, current * self.decrease)
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, now + pause)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rate': self.rate,
+            'concurrency': int(self.limit),
+            'in_flight': self.in_flight,
+            'throttled': self.throttle_count,
+            'paused_for': max(0.0, self.blocked_until - time.monotonic())
+        }
+
+
+def create_limiter(max_concurrency: Optional[int] = None) -> AdaptiveLimiter:
+    """Limiter configured from RPC_RATE_LIMIT / RPC_MAX_CONCURRENCY"""
+    rate = float(os.environ.get("RPC_RATE_LIMIT", 0)) or None
+    concurrency = max_concurrency or int(os.environ.get("RPC_MAX_CONCURRENCY", 32))
+    return AdaptiveLimiter(concurrency, rate=rate)
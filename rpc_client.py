@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from rate_limiter import AdaptiveLimiter, create_limiter, is_rate_limit_error, parse_retry_after
+
+
+# Read-only methods: identical calls already in flight share one request
+COALESCED_METHODS = frozenset({
+    'eth_blockNumber', 'eth_chainId', 'eth_gasPrice', 'eth_maxPriorityFeePerGas', 'eth_feeHistory',
+    'eth_getBalance', 'eth_getCode', 'eth_call', 'eth_estimateGas', 'eth_getTransactionCount'
+})
+# Error messages providers use when a batch array has too many calls
+BATCH_LIMIT_MARKERS = ('batch size', 'batch limit', 'batch too large', 'batch is too large',
+                       'batch request limit', 'too many requests in batch', 'max batch', 'maximum batch')
+
+
+def is_batch_limit_error(error: Any) -> bool:
+    message = str(error.get('message', error) if isinstance(error, dict) else error).lower()
+    return any(marker in message for marker in BATCH_LIMIT_MARKERS)
+
+
+class RpcError(Exception):
+    """JSON-RPC error returned by a node"""
+
+    def __init__(self, error: Any):
+        self.error = error
+        if isinstance(error, dict):
+            self.code = error.get('code')
+            self.message = str(error.get('message', error))
+        else:
+            self.code = None
+            self.message = str(error)
+        super().__init__(f"RPC Error: {error}")
+
+
+class BatchLimitError(Exception):
+    """Provider rejected a JSON-RPC batch because it was too large"""
+
+
+class RpcClient:
+    """Pooled JSON-RPC client with one keep-alive aiohttp session per RPC host"""
+
+    def __init__(self, connection_limit: Optional[int] = None, dns_cache_ttl: Optional[int] = None,
+                 keepalive_timeout: Optional[float] = None, request_timeout: Optional[float] = None,
+                 batch_size: Optional[int] = None):
+        self.connection_limit = connection_limit or int(os.environ.get("RPC_CONNECTION_LIMIT", 100))
+        self.dns_cache_ttl = dns_cache_ttl or int(os.environ.get("RPC_DNS_CACHE_TTL", 300))
+        self.keepalive_timeout = keepalive_timeout or float(os.environ.get("RPC_KEEPALIVE_TIMEOUT", 60))
+        self.request_timeout = request_timeout or float(os.environ.get("RPC_REQUEST_TIMEOUT", 30))
+        self.batch_size = batch_size or int(os.environ.get("RPC_BATCH_SIZE", 100))
+        # Times a throttled request is sent again after the endpoint's pause
+        self.rate_limit_retries = int(os.environ.get("RPC_RATE_LIMIT_RETRIES", 3))
+        # Longest Retry-After worth waiting for instead of failing (and failing over) right away
+        self.rate_limit_max_wait = float(os.environ.get("RPC_RATE_LIMIT_MAX_WAIT", 10))
+        # Seconds a learned batch size limit is kept before full size batches are tried again
+        self.batch_limit_ttl = float(os.environ.get("RPC_BATCH_LIMIT_TTL", 600))
+
+        # host -> (event loop, session); aiohttp sessions are bound to the loop that created them
+        self._sessions: Dict[str, Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+        self._request_id = 0
+        # (loop, url, method, params) -> shared future of an identical call in flight
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        # host -> (largest batch size the provider accepted after a rejection, when it was learned)
+        self._batch_limits: Dict[str, Tuple[int, float]] = {}
+        # host -> adaptive rate limiter and concurrency window
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    @staticmethod
+    def _host_key(rpc_url: str) -> str:
+        parts = urlsplit(rpc_url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _next_id(self) -> int:
+        self._request_id += 1
+        return self._request_id
+
+    def get_session(self, rpc_url: str) -> aiohttp.ClientSession:
+        """Get the pooled session for the host of rpc_url, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        key = self._host_key(rpc_url)
+
+        entry = self._sessions.get(key)
+        if entry:
+            session_loop, session = entry
+            if session_loop is loop and not session.closed:
+                return session
+
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+        )
+        self._sessions[key] = (loop, session)
+        return session
+
+    def _batch_limit(self, key: str) -> Optional[int]:
+        entry = self._batch_limits.get(key)
+        if entry is None:
+            return None
+        limit, learned_at = entry
+        if time.monotonic() - learned_at >= self.batch_limit_ttl:
+            # Providers raise limits and rejections can be one-offs, so probe full size again
+            del self._batch_limits[key]
+            return None
+        return limit
+
+    def get_limiter(self, rpc_url: str) -> AdaptiveLimiter:
+        key = self._host_key(rpc_url)
+        if key not in self._limiters:
+            self._limiters[key] = create_limiter()
+        return self._limiters[key]
+
+    @staticmethod
+    def _is_throttled(data: Any) -> bool:
+        items = data if isinstance(data, list) else [data]
+        # Some batch size rejections read like throttling ("too many requests in batch"), they are not
+        return any(isinstance(item, dict) and 'error' in item and is_rate_limit_error(item['error'])
+                   and not is_batch_limit_error(item['error'])
+                   for item in items)
+
+    async def post(self, rpc_url: str, payload: Any) -> Any:
+        """POST a raw JSON-RPC payload and return the decoded response body.
+
+        Requests pass through the host's adaptive limiter. A throttled request
+        (HTTP 429 or a rate limit error) slows the host down and is sent again
+        once its Retry-After has passed.
+        """
+        limiter = self.get_limiter(rpc_url)
+        for attempt in range(self.rate_limit_retries + 1):
+            await limiter.acquire()
+            throttled, retry_after = False, None
+            try:
+                session = self.get_session(rpc_url)
+                async with session.post(str(rpc_url), json=payload) as response:
+                    if response.status == 429:
+                        throttled = True
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        if attempt < self.rate_limit_retries and (retry_after or 0) <= self.rate_limit_max_wait:
+                            continue
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+
+                throttled = self._is_throttled(data)
+                # A partly throttled batch is returned, only a fully rejected request is resent
+                if throttled and isinstance(data, dict) and attempt < self.rate_limit_retries:
+                    continue
+                return data
+            finally:
+                if await limiter.release(throttled, retry_after):
+                    logging.warning(f"Rate limited by {self._host_key(rpc_url)}: {limiter.stats()}")
+
+    async def call(self, rpc_url: str, method: str, params: Optional[List[Any]] = None) -> Any:
+        """Run a single JSON-RPC call and return its result, sharing identical in-flight reads"""
+        if method not in COALESCED_METHODS:
+            return await self._call(rpc_url, method, params)
+
+        key = (id(asyncio.get_running_loop()), rpc_url, method, json.dumps(params or [], sort_keys=True))
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._call(rpc_url, method, params))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish_inflight(key, done))
+        # Shielded so one caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(future)
+
+    def _finish_inflight(self, key: tuple, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            # Mark the exception as retrieved even if every caller has gone away
+            future.exception()
+
+    async def _call(self, rpc_url: str, method: str, params: Optional[List[Any]] = None) -> Any:
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params or [],
+            "id": self._next_id()
+        }
+        data = await self.post(rpc_url, payload)
+
+        if 'error' in data:
+            raise RpcError(data['error'])
+
+        return data['result']
+
+    async def batch(self, rpc_url: str, calls: List[Tuple[str, List[Any]]],
+                    batch_size: Optional[int] = None) -> List[Any]:
+        """Run many JSON-RPC calls as batch arrays.
+
+        Returns one entry per call, in order: the call result, or an exception
+        instance when that call (or the request carrying it) failed.
+        """
+        if not calls:
+            return []
+
+        size = batch_size or self.batch_size
+        size = min(size, self._batch_limit(self._host_key(rpc_url)) or size)
+        chunks = [calls[i:i + size] for i in range(0, len(calls), size)]
+
+        chunk_results = await asyncio.gather(*[self._run_batch(rpc_url, chunk) for chunk in chunks])
+        return [result for chunk in chunk_results for result in chunk]
+
+    async def _run_batch(self, rpc_url: str, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        """Send one batch array, halving it while the provider rejects the size"""
+        try:
+            return await self._post_batch(rpc_url, calls)
+        except BatchLimitError as e:
+            if len(calls) == 1:
+                return [RpcError(str(e))]
+
+            key = self._host_key(rpc_url)
+            half = len(calls) // 2
+            self._batch_limits[key] = (min(self._batch_limit(key) or half, half), time.monotonic())
+            logging.warning(f"Batch of {len(calls)} rejected by {key}, retrying in batches of {half}")
+
+            left, right = await asyncio.gather(
+                self._run_batch(rpc_url, calls[:half]),
+                self._run_batch(rpc_url, calls[half:])
+            )
+            return left + right
+        except Exception as e:
+            return [e] * len(calls)
+
+    async def _post_batch(self, rpc_url: str, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        ids = [self._next_id() for _ in calls]
+        payload = [
+            {"jsonrpc": "2.0", "method": method, "params": params or [], "id": request_id}
+            for request_id, (method, params) in zip(ids, calls)
+        ]
+
+        try:
+            data = await self.post(rpc_url, payload)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 413:
+                raise BatchLimitError(f"HTTP {e.status}: {e.message}")
+            raise
+
+        # Providers answer a rejected batch with a single error object instead of an array.
+        # Only a size rejection is worth splitting, anything else (e.g. throttling) fails every call.
+        if not isinstance(data, list):
+            error = data.get('error', data) if isinstance(data, dict) else data
+            if is_batch_limit_error(error):
+                raise BatchLimitError(f"Batch rejected: {error}")
+            return [RpcError(error) for _ in calls]
+
+        by_id = {item.get('id'): item for item in data if isinstance(item, dict)}
+        results = []
+        for request_id in ids:
+            item = by_id.get(request_id)
+            if item is None:
+                results.append(RpcError("Missing response in batch"))
+            elif 'error' in item:
+                results.append(RpcError(item['error']))
+            else:
+                results.append(item.get('result'))
+        return results
+
+    async def close(self):
+        """Close every pooled session owned by the current event loop"""
+        loop = asyncio.get_running_loop()
+        for key, (session_loop, session) in list(self._sessions.items()):
+            if session_loop is loop:
+                await session.close()
+                del self._sessions[key]
+            elif session_loop.is_closed():
+                # The loop is gone, nothing left to close cleanly
+                del self._sessions[key]
@@ -5,6 +5,11 @@ class EVMMultiSender {
         this.wallets = [];
         this.selectedNetwork = null;
         this.balances = [];
+        this.currentJobId = null;
+        this.sendController = null;
+        // Serverless hosts can't keep a background job running, stream the send there instead
+        this.backgroundJobs = document.body.dataset.backgroundJobs === 'true';
+        this.renderPending = false;
         this.init();
     }
 
@@ -33,6 +38,11 @@ class EVMMultiSender {
             this.sendTransactions();
         });
 
+        // Cancel running batch send
+        document.getElementById('cancelJobBtn').addEventListener('click', () => {
+            this.cancelJob();
+        });
+
         // Clear session
         document.getElementById('clearSessionBtn').addEventListener('click', () => {
             this.clearSession();
@@ -105,6 +115,15 @@ class EVMMultiSender {
                 this.wallets = data.wallets;
                 this.displayWallets();
                 this.showAlert(`Berhasil mengimpor ${data.count} wallet!`, 'success');
+                if (data.invalid_count || data.duplicate_count) {
+                    const details = (data.diagnostics || []).slice(0, 5)
+                        .map(d => `${d.entry !== undefined ? `Entri ${d.entry}` : `Baris ${d.line}`}: ${d.error}`).join('<br>');
+                    this.showAlert(
+                        `${data.invalid_count} baris tidak valid dan ${data.duplicate_count} duplikat dilewati.` +
+                        (details ? `<br>${details}` : ''),
+                        'warning'
+                    );
+                }
                 document.getElementById('networkSection').style.display = 'block';
             } else {
                 this.showAlert(data.error || 'Gagal mengimpor private key.');
@@ -215,11 +234,21 @@ class EVMMultiSender {
             return;
         }
 
+        const loadBtn = document.getElementById('loadBalancesBtn');
+        const progress = document.getElementById('balancesProgress');
+
         try {
             const networkConfig = this.getNetworkConfig();
-            this.showLoading('Memuat saldo wallet...');
+            loadBtn.disabled = true;
 
-            const response = await fetch('/get_balances', {
+            // Show every wallet right away, balances fill in as they stream
+            this.balances = this.wallets.map(wallet => ({
+                address: wallet.address,
+                balance_formatted: '...'
+            }));
+            this.displayBalances(networkConfig.symbol);
+
+            const response = await fetch('/get_balances/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -229,24 +258,79 @@ class EVMMultiSender {
                 })
             });
 
-            const data = await response.json();
-
-            if (data.success) {
-                this.balances = data.balances;
-                this.displayBalances(networkConfig.symbol);
-                this.showAlert('Saldo berhasil dimuat!', 'success');
-                document.getElementById('transferSection').style.display = 'block';
-            } else {
-                this.showAlert(data.error || 'Gagal memuat saldo.');
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.error || 'Gagal memuat saldo.');
             }
+
+            let loaded = 0;
+            await this.readEventStream(response, (event, data) => {
+                if (event === 'balance') {
+                    this.balances[data.index] = data;
+                    loaded++;
+                    progress.textContent = `(${loaded}/${this.balances.length})`;
+                    this.scheduleRender(() => this.displayBalances(networkConfig.symbol));
+                } else if (event === 'error') {
+                    throw new Error(data.error || 'Gagal memuat saldo.');
+                }
+            });
+
+            this.displayBalances(networkConfig.symbol);
+            this.showAlert('Saldo berhasil dimuat!', 'success');
+            document.getElementById('transferSection').style.display = 'block';
         } catch (error) {
             console.error('Error loading balances:', error);
             this.showAlert(error.message || 'Error memuat saldo.');
         } finally {
-            this.hideLoading();
+            loadBtn.disabled = false;
+            progress.textContent = '';
+        }
+    }
+
+    async readEventStream(response, onEvent) {
+        // Minimal Server-Sent Events parser over a fetch() body, EventSource can't POST
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                message.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                onEvent(event, data ? JSON.parse(data) : null);
+            }
         }
     }
 
+    scheduleRender(render) {
+        // Coalesce bursts of streamed results into one render per frame
+        if (this.renderPending) {
+            return;
+        }
+        this.renderPending = true;
+        requestAnimationFrame(() => {
+            this.renderPending = false;
+            render();
+        });
+    }
+
     displayBalances(symbol) {
         const container = document.getElementById('balancesContainer');
         const balancesList = document.getElementById('balancesList');
@@ -319,7 +403,12 @@ class EVMMultiSender {
 
             this.showLoading('Mengirim transaksi... Ini mungkin memakan waktu.');
 
-            const response = await fetch('/send_transactions', {
+            if (!this.backgroundJobs) {
+                await this.streamSend(networkConfig, percentage, recipientAddress);
+                return;
+            }
+
+            const response = await fetch('/jobs/send_transactions', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -334,9 +423,13 @@ class EVMMultiSender {
             const data = await response.json();
 
             if (data.success) {
-                this.displayResults(data.results, networkConfig.symbol);
-                this.showAlert('Transaksi selesai! Periksa hasil di bawah.', 'info');
                 document.getElementById('resultsSection').style.display = 'block';
+                const job = await this.pollJob(data.job_id, networkConfig.symbol);
+                if (job.status === 'cancelled') {
+                    this.showAlert('Pengiriman dibatalkan. Wallet yang sudah diproses ada di bawah.', 'warning');
+                } else {
+                    this.showAlert('Transaksi selesai! Periksa hasil di bawah.', 'info');
+                }
             } else {
                 this.showAlert(data.error || 'Gagal mengirim transaksi.');
             }
@@ -348,6 +441,158 @@ class EVMMultiSender {
         }
     }
 
+    async streamSend(networkConfig, percentage, recipientAddress) {
+        const results = [];
+        const confirmations = {};
+        const cancelBtn = document.getElementById('cancelJobBtn');
+        this.sendController = new AbortController();
+        cancelBtn.style.display = 'inline-block';
+
+        try {
+            const response = await fetch('/send_transactions/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    network: networkConfig,
+                    percentage: percentage,
+                    recipient_address: recipientAddress
+                }),
+                signal: this.sendController.signal
+            });
+
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.error || 'Gagal mengirim transaksi.');
+            }
+
+            document.getElementById('resultsSection').style.display = 'block';
+            let total = 0;
+            let finished = false;
+            let serverError = null;
+            try {
+                await this.readEventStream(response, (event, data) => {
+                    if (event === 'start') {
+                        total = data.total;
+                    } else if (event === 'result') {
+                        results.push(data);
+                        document.getElementById('loadingText').textContent = `Mengirim transaksi... ${results.length}/${total}`;
+                        this.scheduleRender(() => this.displayResults(results, networkConfig.symbol));
+                    } else if (event === 'receipt') {
+                        confirmations[data.tx_hash] = data;
+                        results.forEach(result => {
+                            if (result.tx_hash && confirmations[result.tx_hash]) {
+                                result.confirmation = confirmations[result.tx_hash].confirmation;
+                            }
+                        });
+                        document.getElementById('loadingText').textContent =
+                            `Menunggu konfirmasi... ${Object.keys(confirmations).length}/${results.filter(r => r.tx_hash).length}`;
+                        this.scheduleRender(() => this.displayResults(results, networkConfig.symbol));
+                    } else if (event === 'done') {
+                        finished = true;
+                    } else if (event === 'error') {
+                        serverError = new Error(data.error || 'Gagal mengirim transaksi.');
+                        throw serverError;
+                    }
+                });
+            } catch (error) {
+                // The platform may cut a long stream; what was broadcast before that still went out
+                if (error === serverError || error.name === 'AbortError' || !results.length) {
+                    throw error;
+                }
+                console.warn('Send stream closed early:', error);
+            }
+
+            this.displayResults(results, networkConfig.symbol);
+            if (finished) {
+                this.showAlert('Transaksi selesai! Periksa hasil di bawah.', 'info');
+            } else if (results.length) {
+                this.showAlert(
+                    `Koneksi terputus setelah ${results.length}/${total} wallet diproses. ` +
+                    'Transaksi yang sudah terkirim ada di bawah; periksa konfirmasinya di explorer.',
+                    'warning'
+                );
+            } else {
+                throw new Error('Koneksi terputus sebelum ada transaksi yang diproses.');
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                throw error;
+            }
+            this.displayResults(results, networkConfig.symbol);
+            this.showAlert('Pengiriman dibatalkan. Wallet yang sudah diproses ada di bawah.', 'warning');
+        } finally {
+            this.sendController = null;
+            cancelBtn.style.display = 'none';
+        }
+    }
+
+    async pollJob(jobId, symbol) {
+        const results = [];
+        const cancelBtn = document.getElementById('cancelJobBtn');
+        this.currentJobId = jobId;
+        cancelBtn.style.display = 'inline-block';
+
+        try {
+            while (true) {
+                const response = await fetch(`/jobs/${jobId}?offset=${results.length}`);
+                const job = await response.json();
+
+                if (!job.success) {
+                    throw new Error(job.error || 'Gagal memuat status pengiriman.');
+                }
+
+                const confirmations = Object.values(job.confirmations || {});
+                if (job.results.length || confirmations.length) {
+                    results.push(...job.results);
+                    results.forEach(result => {
+                        if (result.tx_hash && job.confirmations[result.tx_hash]) {
+                            result.confirmation = job.confirmations[result.tx_hash].confirmation;
+                        }
+                    });
+                    this.displayResults(results, symbol);
+                }
+                document.getElementById('loadingText').textContent = job.completed < job.total
+                    ? `Mengirim transaksi... ${job.completed}/${job.total}`
+                    : `Menunggu konfirmasi... ${confirmations.length}/${results.filter(r => r.tx_hash).length}`;
+
+                if (job.status === 'failed') {
+                    throw new Error(job.error || 'Gagal mengirim transaksi.');
+                }
+                if (job.status === 'completed' || job.status === 'cancelled') {
+                    return job;
+                }
+
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+        } finally {
+            this.currentJobId = null;
+            cancelBtn.style.display = 'none';
+        }
+    }
+
+    async cancelJob() {
+        if (this.sendController) {
+            // Closing the stream cancels the send on the server
+            this.sendController.abort();
+            return;
+        }
+        if (!this.currentJobId) {
+            return;
+        }
+
+        try {
+            await fetch(`/jobs/${this.currentJobId}/cancel`, {
+                method: 'POST'
+            });
+            document.getElementById('loadingText').textContent = 'Membatalkan pengiriman...';
+        } catch (error) {
+            console.error('Error cancelling job:', error);
+            this.showAlert('Error membatalkan pengiriman.');
+        }
+    }
+
     displayResults(results, symbol) {
         const container = document.getElementById('resultsContainer');
         
@@ -376,6 +621,7 @@ class EVMMultiSender {
                         <span class="status-badge ${result.status === 'success' ? 'status-success' : 'status-failed'}">
                             ${result.status}
                         </span>
+                        ${result.confirmation ? `<small class="text-muted ms-1">${result.confirmation}</small>` : ''}
                     </div>
                     <div class="result-amount">
                         ${result.amount} ${symbol}
@@ -29,8 +29,8 @@ class Application:
 
 class ContextTypes:
     DEFAULT_TYPE = None
-from models import db, AccessToken
-from app import app
+from models import db, AccessToken, token_owner
+from app import app, reaper
 
 # Set up logging
 logging.basicConfig(
@@ -96,7 +96,7 @@ Ketik /help untuk bantuan lebih lanjut.
             with app.app_context():
                 # Check if user already has an active token
                 existing_token = AccessToken.query.filter_by(
-                    name=f"TG_{user_id}",
+                    owner=token_owner('TG', user_id),
                     is_active=True
                 ).first()
                 
@@ -127,6 +127,7 @@ Ketik /help untuk bantuan lebih lanjut.
                 token_record = AccessToken()
                 token_record.token = new_token
                 token_record.name = f"TG_{user_id}"
+                token_record.owner = token_owner('TG', user_id)
                 token_record.is_active = True
                 token_record.created_at = datetime.utcnow()
                 
@@ -221,6 +222,9 @@ Hubungi developer: @your_telegram_username
     
     async def run(self):
         """Start the bot"""
+        # The bot may run without a web process, so it reaps expired rows too
+        if reaper.enabled:
+            reaper.start()
         await self.application.initialize()
         await self.application.start()
         await self.application.updater.start_polling()
@@ -232,6 +236,7 @@ Hubungi developer: @your_telegram_username
             await self.application.updater.stop()
             await self.application.stop()
             await self.application.shutdown()
+            reaper.stop()
 
 async def start_bot():
     """Initialize and start the bot"""
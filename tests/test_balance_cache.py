@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balance_cache import BalanceCache
+
+PUBLIC = ('https://rpc-a.example', 'https://rpc-b.example')
+CUSTOM = ('https://my-node.example',)
+
+
+def test_resolved_transaction_invalidates_balances_read_while_pending():
+    cache = BalanceCache(ttl=60)
+    cache.watch_transaction('0xABC', 1, ['0xFrom', '0xTo'])
+    # Read between broadcast and mining, still the pre-transfer values
+    cache.put(PUBLIC, 1, '0xfrom', 100)
+    cache.put(PUBLIC, 1, '0xto', 5)
+    cache.put(PUBLIC, 1, '0xother', 7)
+
+    cache.invalidate_transaction('0xabc')
+
+    assert set(cache.get_many(PUBLIC, 1, ['0xfrom', '0xto', '0xother'])) == {'0xother'}
+    # Only the first resolution counts
+    cache.put(PUBLIC, 1, '0xfrom', 0)
+    cache.invalidate_transaction('0xabc')
+    assert cache.get_many(PUBLIC, 1, ['0xfrom'])['0xfrom'].balance_wei == 0
+
+
+def test_balances_stay_with_the_endpoints_they_were_read_from():
+    cache = BalanceCache(ttl=60)
+    # A session whose own node claims to be chain 1
+    cache.put(CUSTOM, 1, '0xabc', 10 ** 30)
+
+    assert cache.get_many(PUBLIC, 1, ['0xabc']) == {}
+    assert cache.get_many(CUSTOM, 1, ['0xabc'])['0xabc'].balance_wei == 10 ** 30
+
+
+def test_invalidate_covers_every_source():
+    cache = BalanceCache(ttl=60)
+    cache.put(PUBLIC, 1, '0xAbc', 1)
+    cache.put(CUSTOM, 1, '0xabc', 2)
+    cache.put(PUBLIC, 5, '0xabc', 3)
+
+    cache.invalidate(1, ['0xABC'])
+
+    assert cache.get_many(PUBLIC, 1, ['0xabc']) == {}
+    assert cache.get_many(CUSTOM, 1, ['0xabc']) == {}
+    assert cache.get_many(PUBLIC, 5, ['0xabc'])['0xabc'].balance_wei == 3
+
+
+def test_eviction_keeps_the_source_index_in_step():
+    cache = BalanceCache(max_entries=2, ttl=60)
+    for balance, address in enumerate(['0x1', '0x2', '0x3']):
+        cache.put(PUBLIC, 1, address, balance)
+
+    assert set(cache.get_many(PUBLIC, 1, ['0x1', '0x2', '0x3'])) == {'0x2', '0x3'}
+    assert (1, '0x1') not in cache._sources
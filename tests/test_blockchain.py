@@ -0,0 +1,202 @@
+import asyncio
+import os
+import sys
+
+import rlp
+from eth_account import Account
+from eth_account._utils.legacy_transactions import Transaction
+from eth_account.typed_transactions import TypedTransaction
+from hexbytes import HexBytes
+from web3 import Web3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import blockchain
+from retry_policy import RetryPolicy
+from rpc_client import RpcError
+
+GWEI = 10 ** 9
+NETWORK = {'name': 'Test', 'rpc_url': 'https://node.example', 'chain_id': 1, 'explorer': ''}
+RECIPIENT = '0x' + '22' * 20
+
+
+def make_wallets(count, balance):
+    accounts = [Account.from_key('0x' + f'{i + 1:064x}') for i in range(count)]
+    wallets = [{'address': account.address, 'private_key': account.key.hex()} for account in accounts]
+    return wallets, {wallet['address'].lower(): balance for wallet in wallets}
+
+
+class Node:
+    """Stands in for RpcClient: one EIP-1559 chain that applies legacy transfers it accepts"""
+
+    def __init__(self, balances, base_fee=10 * GWEI):
+        self.balances = balances
+        self.nonces = {address: 0 for address in balances}
+        self.base_fee = base_fee
+        # Pending counts to report before the real ones, e.g. from a lagging node
+        self.stale_counts = {}
+        # Answers for the next eth_sendRawTransaction sent in a batch / on its own
+        self.batch_send_errors = []
+        self.call_send_errors = []
+        self.sent = []
+        # Methods sent as single calls rather than in a batch
+        self.single_calls = []
+
+    def _decode(self, raw_hex):
+        """(nonce, value, gas, price per gas actually charged)"""
+        raw = Web3.to_bytes(hexstr=raw_hex)
+        if raw[0] >= 0x80:
+            legacy = rlp.decode(raw, Transaction)
+            return legacy.nonce, legacy.value, legacy.gas, legacy.gasPrice
+        typed = TypedTransaction.from_bytes(HexBytes(raw)).as_dict()
+        price = min(typed['maxFeePerGas'], self.base_fee + typed['maxPriorityFeePerGas'])
+        return typed['nonce'], typed['value'], typed['gas'], price
+
+    def _apply(self, raw_hex):
+        nonce, value, gas, price = self._decode(raw_hex)
+        sender = Account.recover_transaction(raw_hex).lower()
+        if nonce != self.nonces[sender]:
+            raise RpcError({'code': -32000, 'message': f'nonce too low: next nonce {self.nonces[sender]}'})
+        self.nonces[sender] += 1
+        self.balances[sender] -= value + gas * price
+        self.sent.append((sender, nonce))
+        return Web3.to_hex(Web3.keccak(hexstr=raw_hex))
+
+    def _answer(self, method, params, send_errors):
+        if method == 'eth_chainId':
+            return hex(NETWORK['chain_id'])
+        if method == 'eth_blockNumber':
+            return hex(100)
+        if method == 'eth_feeHistory':
+            blocks = int(params[0], 16)
+            return {'baseFeePerGas': [hex(self.base_fee)] * (blocks + 1),
+                    'reward': [[hex(GWEI)] * len(params[2]) for _ in range(blocks)]}
+        if method == 'eth_estimateGas':
+            return hex(21000)
+        if method == 'eth_getCode':
+            return '0x'
+        if method == 'eth_getBalance':
+            return hex(self.balances[params[0].lower()])
+        if method == 'eth_getTransactionCount':
+            address = params[0].lower()
+            if self.stale_counts.get(address) is not None:
+                return hex(self.stale_counts.pop(address))
+            return hex(self.nonces[address])
+        if method == 'eth_sendRawTransaction':
+            if send_errors:
+                error = send_errors.pop(0)
+                if error is not None:
+                    # The node may have taken it before the answer was lost
+                    if not isinstance(error, RpcError) and 'known' not in str(error):
+                        self._apply(params[0])
+                    return error
+            return self._apply(params[0])
+        raise AssertionError(f"unexpected {method}")
+
+    async def call(self, rpc_url, method, params=None):
+        self.single_calls.append(method)
+        answer = self._answer(method, params, self.call_send_errors)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def batch(self, rpc_url, calls, batch_size=None):
+        results = []
+        for method, params in calls:
+            try:
+                results.append(self._answer(method, params, self.batch_send_errors))
+            except RpcError as e:
+                results.append(e)
+        return results
+
+    async def close(self):
+        pass
+
+
+def make_service(node):
+    service = blockchain.BlockchainService(rpc_client=node)
+    service.retry = RetryPolicy(base_delay=0.001, max_delay=0.001)
+    return service
+
+
+def test_service_builds_without_network():
+    service = blockchain.BlockchainService()
+
+    assert service.receipts.rpc is service.rpc
+
+
+def test_max_send_leaves_zero_balance():
+    wallets, balances = make_wallets(3, 10 ** 18 + 12345)
+    node = Node(balances)
+
+    results = asyncio.run(make_service(node).send_transactions_async(wallets, NETWORK, 100, RECIPIENT))
+
+    assert [result['status'] for result in results] == ['success'] * 3
+    assert all(balance == 0 for balance in node.balances.values())
+
+
+def test_nonce_error_falls_back_to_single_send():
+    wallets, balances = make_wallets(2, 10 ** 18)
+    node = Node(balances)
+    first = wallets[0]['address'].lower()
+    # Earlier sends the batch's lagging pending count doesn't show yet
+    node.nonces[first] = 5
+    node.stale_counts[first] = 2
+
+    results = asyncio.run(make_service(node).send_transactions_async(wallets, NETWORK, 100, RECIPIENT))
+
+    assert [result['status'] for result in results] == ['success', 'success']
+    # Rejected at nonce 2 in the batch, resent with the node's count on the single-send path
+    assert node.single_calls.count('eth_sendRawTransaction') == 1
+    assert (first, 5) in node.sent
+    assert node.balances[first] == 0
+
+
+def test_retryable_broadcast_is_resent_and_already_known_counts_as_success():
+    wallets, balances = make_wallets(2, 10 ** 18)
+    node = Node(balances)
+    # First wallet: the batch answer is lost, the re-send finds the node already has it.
+    # Second wallet: the batch itself answers "already known".
+    node.batch_send_errors = [asyncio.TimeoutError(), RpcError({'code': -32000, 'message': 'already known'})]
+    node.call_send_errors = [RpcError({'code': -32000, 'message': 'already known'})]
+
+    results = asyncio.run(make_service(node).send_transactions_async(wallets, NETWORK, 50, RECIPIENT))
+
+    assert [result['status'] for result in results] == ['success', 'success']
+    assert all(result['tx_hash'].startswith('0x') and len(result['tx_hash']) == 66 for result in results)
+    # Only the first wallet was re-sent on its own
+    assert node.single_calls.count('eth_sendRawTransaction') == 1
+    assert node.call_send_errors == []
+
+
+def test_cancel_between_sign_and_broadcast_releases_nonces(monkeypatch):
+    wallets, balances = make_wallets(3, 10 ** 18)
+    node = Node(balances)
+    service = make_service(node)
+    cancelled = []
+    sign = blockchain.sign_transactions_async
+
+    async def sign_then_cancel(items, *args, **kwargs):
+        signed = await sign(items, *args, **kwargs)
+        cancelled.append(True)
+        return signed
+
+    async def run():
+        monkeypatch.setattr(blockchain, 'sign_transactions_async', sign_then_cancel)
+        first = await service.send_transactions_async(wallets, NETWORK, 100, RECIPIENT,
+                                                      should_cancel=lambda: bool(cancelled))
+        in_flight = [service.nonces._state(1, wallet['address']).in_flight for wallet in wallets]
+        # Handed back rather than abandoned: reusable without reading the node again
+        synced = [not service.nonces.needs_sync(1, wallet['address']) for wallet in wallets]
+        monkeypatch.setattr(blockchain, 'sign_transactions_async', sign)
+        second = await service.send_transactions_async(wallets, NETWORK, 100, RECIPIENT)
+        return first, in_flight, synced, second
+
+    first, in_flight, synced, second = asyncio.run(run())
+
+    assert [result['status'] for result in first] == ['cancelled'] * 3
+    assert in_flight == [{}, {}, {}]
+    assert synced == [True, True, True]
+    # Nothing went out, so the next send reuses the same nonces
+    assert [result['status'] for result in second] == ['success'] * 3
+    assert sorted(nonce for _, nonce in node.sent) == [0, 0, 0]
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sys
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crypto_pool
+
+KEYS = [(line, '0x' + f'{line:064x}') for line in range(1, 11)]
+
+
+class FailingExecutor:
+    """Runs the first `working` submissions inline, then refuses like a dead or shut down pool"""
+
+    def __init__(self, working, error):
+        self.working = working
+        self.error = error
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        if self.submitted >= self.working:
+            raise self.error
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    def install(executor):
+        monkeypatch.setattr(crypto_pool, 'PARALLEL_THRESHOLD', 1)
+        monkeypatch.setattr(crypto_pool, 'MAX_WORKERS', 2)
+        monkeypatch.setattr(crypto_pool, '_executor', executor)
+        monkeypatch.setattr(crypto_pool, 'get_executor', lambda: executor)
+    return install
+
+
+@pytest.mark.parametrize('error', [BrokenProcessPool('worker died'), RuntimeError('cannot schedule new futures')])
+def test_refused_chunk_is_derived_inline(pool, error):
+    pool(FailingExecutor(working=1, error=error))
+
+    results = list(crypto_pool.iter_derive_addresses(KEYS, chunk_size=3))
+
+    assert [line for line, _, _, _ in results] == [line for line, _ in KEYS]
+    assert all(address and error is None for _, _, address, error in results)
+    assert crypto_pool._executor is None
+
+
+def test_signing_falls_back_when_the_pool_is_shut_down(pool, monkeypatch):
+    pool(FailingExecutor(working=0, error=RuntimeError('cannot schedule new futures')))
+    monkeypatch.setattr(crypto_pool, 'SIGNING_PARALLEL_THRESHOLD', 1)
+    transaction = {'nonce': 0, 'to': '0x' + '11' * 20, 'value': 1, 'gas': 21000, 'gasPrice': 1, 'chainId': 1}
+
+    results = asyncio.run(crypto_pool.sign_transactions_async([(transaction, key) for _, key in KEYS[:4]],
+                                                              chunk_size=2))
+
+    assert len(results) == 4
+    assert all(signed is not None and error is None for signed, error in results)
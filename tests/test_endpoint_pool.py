@@ -0,0 +1,74 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from endpoint_pool import PooledRpcClient
+from rpc_client import RpcError
+
+
+class FailingClient:
+    """Stands in for RpcClient, any request is a test failure"""
+
+    async def batch(self, rpc_url, calls, batch_size=None):
+        raise AssertionError(f"unexpected batch to {rpc_url}")
+
+    async def call(self, rpc_url, method, params=None):
+        raise AssertionError(f"unexpected {method} to {rpc_url}")
+
+
+def test_empty_batch_on_pooled_network():
+    client = PooledRpcClient(client=FailingClient())
+    rpc_url = client.register('https://rpc-a.example', ['https://rpc-a.example', 'https://rpc-b.example'], 1)
+
+    assert asyncio.run(client.batch(rpc_url, [])) == []
+    assert all(endpoint.failures == 0 for endpoint in client.endpoints(rpc_url))
+
+
+class ScriptedClient:
+    """Stands in for RpcClient, answering each URL from a fixed script"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.requests = []
+
+    async def call(self, rpc_url, method, params=None):
+        self.requests.append(rpc_url)
+        answer = self.answers[rpc_url]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    async def batch(self, rpc_url, calls, batch_size=None):
+        self.requests.append(rpc_url)
+        return [self.answers[rpc_url]] * len(calls)
+
+
+def test_rate_limited_endpoint_fails_over():
+    client = PooledRpcClient(client=ScriptedClient({
+        'https://rpc-a.example': RpcError({'code': -32005, 'message': 'rate limit exceeded'}),
+        'https://rpc-b.example': '0x10',
+    }))
+    rpc_url = client.register('https://rpc-a.example', ['https://rpc-a.example', 'https://rpc-b.example'])
+
+    assert asyncio.run(client.call(rpc_url, 'eth_blockNumber')) == '0x10'
+    assert asyncio.run(client.batch(rpc_url, [('eth_blockNumber', [])] * 3)) == ['0x10'] * 3
+    failures = {endpoint.url: endpoint.failures for endpoint in client.endpoints(rpc_url)}
+    assert failures['https://rpc-a.example'] == 2
+
+
+def test_deterministic_rpc_error_is_final():
+    scripted = ScriptedClient({
+        'https://rpc-a.example': RpcError({'code': -32000, 'message': 'nonce too low'}),
+        'https://rpc-b.example': '0x10',
+    })
+    client = PooledRpcClient(client=scripted)
+    rpc_url = client.register('https://rpc-a.example', ['https://rpc-a.example', 'https://rpc-b.example'])
+
+    with pytest.raises(RpcError):
+        asyncio.run(client.call(rpc_url, 'eth_sendRawTransaction', ['0x00']))
+    assert scripted.requests == ['https://rpc-a.example']
+    assert all(endpoint.failures == 0 for endpoint in client.endpoints(rpc_url))
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fee_engine import FeeEngine, FeeQuote, SWEEP_BASE_FEE_MULTIPLIER
+
+GWEI = 10 ** 9
+NETWORK = {'rpc_url': 'https://rpc.example', 'chain_id': 1}
+TRANSFER_GAS = 21000
+
+
+class FeeNode:
+    """Answers the fee engine's reads from fixed chain data"""
+
+    def __init__(self, base_fee=100 * GWEI, rewards=(1 * GWEI, 2 * GWEI, 5 * GWEI), gas_price=30 * GWEI,
+                 eip1559=True):
+        self.base_fee = base_fee
+        self.rewards = rewards
+        self.gas_price = gas_price
+        self.eip1559 = eip1559
+        self.block = 100
+        self.calls = []
+
+    async def call(self, rpc_url, method, params=None):
+        self.calls.append(method)
+        if method == 'eth_blockNumber':
+            return hex(self.block)
+        if method == 'eth_gasPrice':
+            return hex(self.gas_price)
+        if method == 'eth_feeHistory':
+            blocks = int(params[0], 16)
+            if not self.eip1559:
+                return {'baseFeePerGas': ['0x0'] * (blocks + 1), 'reward': []}
+            return {
+                'baseFeePerGas': [hex(self.base_fee)] * (blocks + 1),
+                'reward': [[hex(reward) for reward in self.rewards] for _ in range(blocks)]
+            }
+        raise AssertionError(f"unexpected {method}")
+
+
+def quote(node, speed=None):
+    engine = FeeEngine(node, tiers={'slow': (10, 1.25), 'standard': (50, 2.0), 'fast': (90, 2.5)})
+    return asyncio.run(engine.get_fees_async(NETWORK, speed))
+
+
+def test_tiers_price_from_fee_history():
+    node = FeeNode()
+
+    slow, standard, fast = (quote(node, speed) for speed in ('slow', 'standard', 'fast'))
+
+    assert (slow.max_priority_fee_per_gas, slow.max_fee_per_gas) == (1 * GWEI, 125 * GWEI + 1 * GWEI)
+    assert (standard.max_priority_fee_per_gas, standard.max_fee_per_gas) == (2 * GWEI, 200 * GWEI + 2 * GWEI)
+    assert (fast.max_priority_fee_per_gas, fast.max_fee_per_gas) == (5 * GWEI, 250 * GWEI + 5 * GWEI)
+    assert standard.transaction_fields() == {'maxFeePerGas': 202 * GWEI, 'maxPriorityFeePerGas': 2 * GWEI}
+    assert standard.cost_per_gas == standard.max_fee_per_gas
+
+
+def test_history_is_read_once_per_block():
+    node = FeeNode()
+    engine = FeeEngine(node, refresh_interval=0.000001)
+
+    async def reads():
+        await engine.get_fees_async(NETWORK, 'slow')
+        await engine.get_fees_async(NETWORK, 'fast')
+
+    asyncio.run(reads())
+    assert node.calls.count('eth_feeHistory') == 1
+
+
+def test_chain_without_eip1559_uses_gas_price():
+    node = FeeNode(eip1559=False)
+
+    fees = quote(node)
+
+    assert not fees.is_eip1559
+    assert fees.transaction_fields() == {'gasPrice': 30 * GWEI}
+    assert fees.sweep_gas_price() == 30 * GWEI
+
+
+def test_sweep_gas_price_sits_just_above_the_base_fee():
+    fees = quote(FeeNode())
+
+    price = fees.sweep_gas_price()
+
+    assert price == int(100 * GWEI * SWEEP_BASE_FEE_MULTIPLIER) + 2 * GWEI
+    assert fees.base_fee + fees.max_priority_fee_per_gas <= price <= fees.max_fee_per_gas
+    # Never above what a type 2 transaction would have reserved
+    assert FeeQuote(101 * GWEI, 2 * GWEI, 100 * GWEI).sweep_gas_price() == 101 * GWEI
+
+
+def test_sweep_empties_the_wallet():
+    fees = quote(FeeNode())
+    balance = 10 ** 18 + 12345
+
+    def left_after(value, charged_per_gas):
+        return balance - value - TRANSFER_GAS * charged_per_gas
+
+    # Type 2: maxFeePerGas is reserved, but only base fee + tip is charged and the rest stays behind
+    type2_value = balance - TRANSFER_GAS * fees.max_fee_per_gas
+    effective = fees.base_fee + fees.max_priority_fee_per_gas
+    assert left_after(type2_value, effective) > 0
+
+    # Legacy sweep: gasPrice is charged in full, so the wallet ends at exactly zero
+    price = fees.sweep_gas_price()
+    sweep_value = balance - TRANSFER_GAS * price
+    assert sweep_value > 0
+    assert price >= fees.base_fee
+    assert left_after(sweep_value, price) == 0
@@ -0,0 +1,47 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from key_parser import KeyFileParser
+
+KEY = 'ab' * 32
+
+
+def parse(content, filename='keys.json'):
+    parser = KeyFileParser()
+    keys = list(parser.iter_keys(io.BytesIO(content.encode()), filename))
+    return parser, keys
+
+
+def test_object_without_key_field_is_diagnosed():
+    parser, keys = parse('{"keys": ["%s"]}' % KEY)
+
+    assert keys == []
+    assert parser.invalid_count == 1
+    assert parser.diagnostics[0]['entry'] == 1
+    assert 'field private key' in parser.diagnostics[0]['error']
+
+
+def test_truncated_array_keeps_entries_and_is_diagnosed():
+    parser, keys = parse('["%s", {"private_key": "0x%s"}' % (KEY, 'cd' * 32))
+
+    assert [entry for entry, _ in keys] == [1, 2]
+    assert parser.diagnostics == [{'entry': 3, 'error': 'File JSON terpotong: array tidak ditutup dengan ]',
+                                   'value': ''}]
+
+
+def test_invalid_json_is_diagnosed():
+    parser, keys = parse('["%s", {"private_key": ' % KEY)
+
+    assert len(keys) == 1
+    assert parser.diagnostics[0]['entry'] == 2
+    assert parser.diagnostics[0]['error'].startswith('File JSON tidak valid')
+
+
+def test_text_files_report_lines():
+    parser, keys = parse('%s\nnot-a-key\n' % KEY, 'keys.txt')
+
+    assert keys == [(1, '0x' + KEY)]
+    assert parser.diagnostics[0]['line'] == 2
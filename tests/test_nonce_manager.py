@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nonce_manager
+from nonce_manager import NonceManager, is_nonce_error
+
+ADDRESS = '0x00000000000000000000000000000000000000aa'
+
+
+class Node:
+    """Pending transaction count as the node reports it"""
+
+    def __init__(self, pending):
+        self.pending = pending
+        self.reads = 0
+
+    async def fetch(self):
+        self.reads += 1
+        return self.pending
+
+
+def run(steps):
+    """Run steps() on one event loop, as the app does for a batch"""
+    return asyncio.run(steps())
+
+
+def test_reservations_come_from_the_local_counter():
+    manager, node = NonceManager(idle_resync=300), Node(7)
+
+    async def steps():
+        return [await manager.reserve(1, ADDRESS, node.fetch) for _ in range(3)]
+
+    assert run(steps) == [7, 8, 9]
+    assert node.reads == 1
+
+
+def test_confirm_release_and_abandon():
+    manager, node = NonceManager(idle_resync=300), Node(5)
+
+    async def steps():
+        first = await manager.reserve(1, ADDRESS, node.fetch)
+        second = await manager.reserve(1, ADDRESS, node.fetch)
+        manager.confirm(1, ADDRESS, first)
+        # The latest reservation failed before reaching the node: reuse it
+        manager.release(1, ADDRESS, second)
+        reused = await manager.reserve(1, ADDRESS, node.fetch)
+        assert node.reads == 1
+
+        # Releasing a nonce with a later one reserved leaves a gap, so resync
+        later = await manager.reserve(1, ADDRESS, node.fetch)
+        manager.release(1, ADDRESS, reused)
+        assert manager.needs_sync(1, ADDRESS)
+        node.pending = 6
+        resynced = await manager.reserve(1, ADDRESS, node.fetch)
+
+        # A cancelled send may or may not have reached the node
+        manager.abandon(1, ADDRESS, resynced)
+        assert manager.needs_sync(1, ADDRESS)
+        # Abandoning a settled nonce changes nothing
+        manager.confirm(1, ADDRESS, later)
+        node.pending = 7
+        settled = await manager.reserve(1, ADDRESS, node.fetch)
+        manager.confirm(1, ADDRESS, settled)
+        manager.abandon(1, ADDRESS, settled)
+        assert not manager.needs_sync(1, ADDRESS)
+        return first, second, reused, later, resynced, settled
+
+    assert run(steps) == (5, 6, 6, 7, 6, 7)
+
+
+def test_idle_account_resyncs_after_external_nonce_bump(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(nonce_manager.time, 'monotonic', lambda: now[0])
+    manager, node = NonceManager(idle_resync=60), Node(3)
+
+    async def steps():
+        first = await manager.reserve(1, ADDRESS, node.fetch)
+        manager.confirm(1, ADDRESS, first)
+        # Another wallet app sends from the same account meanwhile
+        node.pending = 10
+        now[0] += 30
+        in_window = await manager.reserve(1, ADDRESS, node.fetch)
+        now[0] += 61
+        after_idle = await manager.reserve(1, ADDRESS, node.fetch)
+        return first, in_window, after_idle
+
+    assert run(steps) == (3, 4, 10)
+    assert node.reads == 2
+
+
+def test_stale_reservation_does_not_block_resync(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(nonce_manager.time, 'monotonic', lambda: now[0])
+    manager, node = NonceManager(idle_resync=60), Node(3)
+
+    async def steps():
+        # Reserved but never settled, e.g. the worker died mid-send
+        await manager.reserve(1, ADDRESS, node.fetch)
+        now[0] += 61
+        assert manager.needs_sync(1, ADDRESS)
+        node.pending = 4
+        return await manager.reserve(1, ADDRESS, node.fetch)
+
+    assert run(steps) == 4
+
+
+def test_nonce_error_classification():
+    assert is_nonce_error(Exception('nonce too low: next nonce 5, tx nonce 4'))
+    assert is_nonce_error(Exception('Replacement transaction underpriced'))
+    assert not is_nonce_error(Exception('insufficient funds for gas * price + value'))
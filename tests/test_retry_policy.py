@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sys
+
+import aiohttp
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retry_policy import RetryBudget, RetryPolicy, is_already_known, is_retryable
+from rpc_client import RpcError
+
+
+def http_error(status):
+    return aiohttp.ClientResponseError(None, (), status=status)
+
+
+@pytest.mark.parametrize('error', [
+    RpcError({'code': -32000, 'message': 'header not found'}),
+    RpcError({'code': -32005, 'message': 'Too Many Requests'}),
+    RpcError('request timed out'),
+    http_error(429),
+    http_error(502),
+    asyncio.TimeoutError(),
+    aiohttp.ClientConnectionError(),
+    ConnectionResetError(),
+])
+def test_transient_errors_are_retryable(error):
+    assert is_retryable(error)
+
+
+@pytest.mark.parametrize('error', [
+    RpcError({'code': 3, 'message': 'execution reverted'}),
+    RpcError({'code': -32000, 'message': 'nonce too low'}),
+    RpcError({'code': -32000, 'message': 'insufficient funds for gas * price + value'}),
+    http_error(400),
+    ValueError('bad address'),
+])
+def test_final_errors_are_not_retryable(error):
+    assert not is_retryable(error)
+
+
+def test_already_known_classification():
+    assert is_already_known(RpcError({'code': -32000, 'message': 'already known'}))
+    assert is_already_known(RpcError('Known transaction: 0xabc'))
+    assert not is_already_known(RpcError('nonce too low'))
+
+
+def test_budget_for_batch(monkeypatch):
+    monkeypatch.setenv('RETRY_BUDGET_RATIO', '0.2')
+    monkeypatch.setenv('RETRY_BUDGET_MIN', '10')
+    assert RetryBudget.for_batch(5).remaining == 10
+    assert RetryBudget.for_batch(1000).remaining == 200
+
+
+def test_budget_runs_out():
+    budget = RetryBudget(2)
+    assert [budget.spend() for _ in range(3)] == [True, True, False]
+    assert budget.used == 2 and budget.remaining == 0
+
+
+def test_should_retry_respects_attempts_and_budget():
+    policy = RetryPolicy(max_attempts=3)
+    timeout = asyncio.TimeoutError()
+
+    assert policy.should_retry(timeout, 0)
+    assert policy.should_retry(timeout, 1)
+    assert not policy.should_retry(timeout, 2)
+    assert not policy.should_retry(RpcError('execution reverted'), 0)
+
+    budget = RetryBudget(1)
+    assert policy.should_retry(timeout, 0, budget)
+    assert not policy.should_retry(timeout, 0, budget)
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    assert all(0 <= policy.backoff(attempt) <= 5 for attempt in range(10))
+
+
+def test_run_stops_when_the_shared_budget_is_spent():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.001, max_delay=0.001)
+    budget = RetryBudget(3)
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        raise asyncio.TimeoutError()
+
+    async def batch():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await policy.run(operation, budget)
+
+    asyncio.run(batch())
+    # 2 first attempts plus the 3 retries the budget allowed
+    assert len(calls) == 5
+    assert budget.remaining == 0
+
+
+def test_run_returns_after_transient_failure():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001)
+    answers = [asyncio.TimeoutError(), '0x1']
+
+    async def operation():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert asyncio.run(policy.run(operation)) == '0x1'
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rpc_client import RpcClient, RpcError
+
+
+class ScriptedClient(RpcClient):
+    """RpcClient whose POSTs are answered by a function instead of the network"""
+
+    def __init__(self, answer):
+        super().__init__(batch_size=64)
+        self.answer = answer
+        self.posts = []
+
+    async def post(self, rpc_url, payload):
+        self.posts.append(payload)
+        return self.answer(payload)
+
+
+def test_rate_limited_batch_is_not_split():
+    client = ScriptedClient(lambda payload: {'error': {'code': -32005, 'message': 'rate limit exceeded'}})
+    calls = [('eth_getBalance', [f'0x{i:040x}', 'latest']) for i in range(64)]
+
+    results = asyncio.run(client.batch('https://rpc.example', calls))
+
+    assert len(client.posts) == 1
+    assert len(results) == 64
+    assert all(isinstance(result, RpcError) and 'rate limit' in result.message for result in results)
+    assert client._batch_limits == {}
+
+
+def test_batch_size_error_splits_and_limit_expires():
+    def answer(payload):
+        if len(payload) > 16:
+            return {'error': {'code': -32600, 'message': 'batch size too large'}}
+        return [{'id': item['id'], 'result': '0x1'} for item in payload]
+
+    client = ScriptedClient(answer)
+    calls = [('eth_blockNumber', []) for _ in range(64)]
+
+    assert asyncio.run(client.batch('https://rpc.example', calls)) == ['0x1'] * 64
+    assert client._batch_limit('https://rpc.example') == 16
+
+    client.batch_limit_ttl = 0
+    assert client._batch_limit('https://rpc.example') is None
+
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status = 200
+        self.headers = {}
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self, content_type=None):
+        return self.body
+
+
+class SessionClient(RpcClient):
+    """RpcClient whose HTTP session answers from a function, so post() and its limiter run for real"""
+
+    def __init__(self, answer):
+        super().__init__(batch_size=64)
+        self.answer = answer
+        self.posts = []
+
+    def get_session(self, rpc_url):
+        client = self
+
+        class Session:
+            def post(self, url, json=None):
+                client.posts.append(json)
+                return FakeResponse(client.answer(json))
+
+        return Session()
+
+
+def test_batch_size_error_worded_like_a_rate_limit_is_not_throttling():
+    def answer(payload):
+        if len(payload) > 16:
+            return {'error': {'code': -32600, 'message': 'too many requests in batch, max 16'}}
+        return [{'id': item['id'], 'result': '0x1'} for item in payload]
+
+    client = SessionClient(answer)
+    calls = [('eth_blockNumber', []) for _ in range(32)]
+
+    assert asyncio.run(client.batch('https://rpc.example', calls)) == ['0x1'] * 32
+    # The oversized batch is split right away instead of being resent as throttled
+    assert [len(payload) for payload in client.posts] == [32, 16, 16]
+    assert client.get_limiter('https://rpc.example').throttle_count == 0